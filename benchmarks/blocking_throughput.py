@@ -0,0 +1,95 @@
+"""Messages per second through a BlockingTransferHolder.
+
+P processes each push K output interrupts (and optionally K input
+interrupts) through one blocking transfer whose holder does no work, so the
+number measures the scheduler and transfer queue overhead. With --batch the
+holder implements stdout_batch/stdin_batch, and --latency adds a simulated
+round trip to every holder call.
+
+    python benchmarks/blocking_throughput.py --processes 1000 --messages 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ioscheduler
+
+
+def run(processes : int, messages : int, with_input : bool, mode : str, batch : bool = False, latency : float = 0):
+    state = {'done': 0}
+
+    async def round_trip():
+        if latency > 0: await asyncio.sleep(latency)
+
+    class NullTransfer(ioscheduler.BlockingTransferHolder):
+        @staticmethod
+        async def stdout(transfer, data):
+            await round_trip()
+            return 0
+
+        @staticmethod
+        async def stdin(transfer):
+            await round_trip()
+            return 1, 0
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= processes
+
+    class BatchTransfer(NullTransfer):
+        @staticmethod
+        async def stdout_batch(transfer, data_list):
+            await round_trip()
+            return [0] * len(data_list)
+
+        @staticmethod
+        async def stdin_batch(transfer, data_list):
+            await round_trip()
+            return [(1, 0)] * len(data_list)
+
+    class Sender(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            await process.output_interrupt(process.locals['sent'])
+            if with_input == True:
+                await process.input_interrupt(proc_output=process.locals['sent'])
+            process.locals['sent'] += 1
+            if process.locals['sent'] >= messages: state['done'] += 1
+
+        @staticmethod
+        def stop_condition(process):
+            return process.locals['sent'] >= messages
+
+    ioscheduler.create_transfer(BatchTransfer if batch == True else NullTransfer, None, 'null')
+    for _ in range(processes):
+        ioscheduler.create_process(Sender, {'sent': 0}, 'null')
+    start = time.perf_counter()
+    if mode == 'polling':
+        ioscheduler.start()
+    else:
+        ioscheduler.start(mode)
+    elapsed = time.perf_counter() - start
+    total = processes * messages * (2 if with_input == True else 1)
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--with-input', action='store_true')
+    parser.add_argument('--mode', default='polling')
+    parser.add_argument('--batch', action='store_true')
+    parser.add_argument('--latency', type=float, default=0)
+    args = parser.parse_args()
+    rate = run(args.processes, args.messages, args.with_input, args.mode, args.batch, args.latency)
+    print(f"mode={args.mode} processes={args.processes} messages={args.messages} "
+          f"with_input={args.with_input} batch={args.batch} latency={args.latency} messages_per_sec={rate:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Messages per second through a high-latency FreeTransferHolder.
+
+P processes each push K output interrupts through one free transfer whose
+stdout call sleeps for --latency seconds, like a request to a remote service.
+With --concurrency N up to N of those calls are in flight at once.
+
+    python benchmarks/free_concurrency.py --concurrency 1 16 64
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ioscheduler
+
+
+def run(processes : int, messages : int, latency : float, concurrency : int, mode : str):
+    state = {'done': 0}
+    scheduler = ioscheduler.Scheduler(mode)
+
+    class RemoteTransfer(ioscheduler.FreeTransferHolder):
+        @staticmethod
+        async def stdout(transfer, data, request_uuid):
+            await asyncio.sleep(latency)
+            return 0, request_uuid
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= processes
+    RemoteTransfer.concurrency = concurrency
+
+    class Producer(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            for i in range(messages):
+                await process.output_interrupt(i)
+            process.locals['sent'] = True
+            state['done'] += 1
+
+        @staticmethod
+        def stop_condition(process):
+            return process.locals['sent']
+
+    scheduler.create_transfer(RemoteTransfer, None, 'remote')
+    for _ in range(processes):
+        scheduler.create_process(Producer, {'sent': False}, 'remote')
+    start = time.perf_counter()
+    scheduler.start()
+    return processes * messages / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=100)
+    parser.add_argument('--messages', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 16, 64])
+    parser.add_argument('--mode', default='wakeup')
+    args = parser.parse_args()
+    for concurrency in args.concurrency:
+        rate = run(args.processes, args.messages, args.latency, concurrency, args.mode)
+        print(f"mode={args.mode} concurrency={concurrency} latency={args.latency} messages_per_sec={rate:.0f}")
+
+
+if __name__ == '__main__':
+    main()
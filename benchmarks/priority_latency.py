@@ -0,0 +1,94 @@
+"""Interactive interrupt latency while batch processes saturate a transfer.
+
+B batch processes keep a free transfer busy with output interrupts
+while I interactive processes send one interrupt at a time and record how
+long each took. With --weights the two kinds run in separate priority
+classes, without it everything shares the default class.
+
+    python benchmarks/priority_latency.py --weights 8 1
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ioscheduler
+
+
+def percentile(values : list, fraction : float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(batch : int, interactive : int, messages : int, service : float, weights : list, mode : str):
+    state = {'done': 0, 'latencies': []}
+    if weights == None:
+        scheduler = ioscheduler.Scheduler(mode)
+        classes = ('default', 'default')
+    else:
+        scheduler = ioscheduler.Scheduler(mode, classes={'interactive': weights[0], 'batch': weights[1]})
+        classes = ('interactive', 'batch')
+
+    class SlowTransfer(ioscheduler.FreeTransferHolder):
+        @staticmethod
+        async def stdout(transfer, data, request_uuid):
+            await asyncio.sleep(service)
+            return 0, request_uuid
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= interactive
+
+    class Batch(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            await process.output_interrupt(0)
+
+        @staticmethod
+        def stop_condition(process):
+            return state['done'] >= interactive
+
+    class Interactive(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            await asyncio.sleep(0.01)
+            start = time.perf_counter()
+            await process.output_interrupt(1)
+            state['latencies'].append(time.perf_counter() - start)
+            process.locals['sent'] += 1
+            if process.locals['sent'] == messages: state['done'] += 1
+
+        @staticmethod
+        def stop_condition(process):
+            return process.locals['sent'] >= messages
+
+    scheduler.create_transfer(SlowTransfer, None, 'slow')
+    for _ in range(batch):
+        scheduler.create_process(Batch, None, 'slow', classes[1])
+    for _ in range(interactive):
+        scheduler.create_process(Interactive, {'sent': 0}, 'slow', classes[0])
+    scheduler.start()
+    return state['latencies'], scheduler.class_metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--batch', type=int, default=200)
+    parser.add_argument('--interactive', type=int, default=5)
+    parser.add_argument('--messages', type=int, default=20)
+    parser.add_argument('--service', type=float, default=0.0005)
+    parser.add_argument('--weights', type=float, nargs=2, default=None)
+    parser.add_argument('--mode', default='wakeup')
+    args = parser.parse_args()
+    latencies, metrics = run(args.batch, args.interactive, args.messages, args.service, args.weights, args.mode)
+    print(f"mode={args.mode} weights={args.weights} interactive_p50_ms={percentile(latencies, 0.5) * 1000:.2f} "
+          f"interactive_p99_ms={percentile(latencies, 0.99) * 1000:.2f}")
+    for name, stats in metrics.items():
+        print(f"  {name}: {stats}")
+
+
+if __name__ == '__main__':
+    main()
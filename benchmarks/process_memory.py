@@ -0,0 +1,71 @@
+"""Memory per process and run time for a large process table.
+
+Creates N processes that each send one output interrupt to a blocking
+transfer which echoes the payload back as the reply code, and checks every
+process got its own payload back (replies are routed by pid). Reports the
+traced Python memory per created process and the time to run them all.
+
+    python benchmarks/process_memory.py --processes 1000000
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ioscheduler
+
+
+def run(processes : int, mode : str):
+    state = {'done': 0, 'mismatched': 0}
+    scheduler = ioscheduler.Scheduler(mode)
+
+    class Echo(ioscheduler.BlockingTransferHolder):
+        @staticmethod
+        async def stdout(transfer, data):
+            return data
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= processes
+
+    class Light(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            if await process.output_interrupt(process.locals) is not process.locals: state['mismatched'] += 1
+            process.locals[0] = True
+            state['done'] += 1
+
+        @staticmethod
+        def stop_condition(process):
+            return process.locals[0]
+
+    scheduler.create_transfer(Echo, None, 'echo')
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _ in range(processes):
+        scheduler.create_process(Light, [False], 'echo')
+    per_process = (tracemalloc.get_traced_memory()[0] - before) / processes
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    scheduler.start()
+    elapsed = time.perf_counter() - start
+    return per_process, elapsed, state['mismatched'], resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=100000)
+    parser.add_argument('--mode', default='wakeup')
+    args = parser.parse_args()
+    per_process, elapsed, mismatched, rss = run(args.processes, args.mode)
+    print(f"mode={args.mode} processes={args.processes} bytes_per_process={per_process:.0f} "
+          f"run_sec={elapsed:.2f} mismatched_replies={mismatched} peak_rss_mb={rss:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Throughput of CPU-heavy processes as the number of shards grows.
+
+Every process burns CPU in its body and reports each result with an output
+interrupt to a sink transfer owned by shard 0, so shards other than 0 go
+through the cross-shard forwarding path. Scaling is bounded by the number of
+cores the machine actually has.
+
+    python benchmarks/sharded_scaling.py --shards 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ioscheduler
+from ioscheduler.sharding import ShardedScheduler
+
+cluster = None # set per run, read by holders in every shard
+
+
+class Sink(ioscheduler.FreeTransferHolder):
+    @staticmethod
+    async def stdout(transfer, data, request_uuid):
+        return 0, request_uuid
+
+    @staticmethod
+    def stop_condition(transfer):
+        return cluster.processes_alive() == 0
+
+
+class Worker(ioscheduler.ProcessHolder):
+    @staticmethod
+    async def body(process):
+        total = 0
+        for i in range(process.locals['work']):
+            total += i * i
+        await process.output_interrupt(total)
+        process.locals['done'] += 1
+
+    @staticmethod
+    def stop_condition(process):
+        return process.locals['done'] >= process.locals['iterations']
+
+
+def run(shards : int, processes : int, iterations : int, work : int):
+    global cluster
+    cluster = ShardedScheduler(shards)
+    cluster.create_transfer(Sink, None, 'sink', shard=0)
+    for _ in range(processes):
+        cluster.create_process(Worker, {'done': 0, 'iterations': iterations, 'work': work}, 'sink')
+    start = time.perf_counter()
+    cluster.start()
+    return processes * iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--processes', type=int, default=64)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--work', type=int, default=20000)
+    args = parser.parse_args()
+    base = None
+    for shards in args.shards:
+        rate = run(shards, args.processes, args.iterations, args.work)
+        base = rate if base == None else base
+        print(f"shards={shards} cores={os.cpu_count()} iterations_per_sec={rate:.0f} speedup={rate / base:.2f}")
+
+
+if __name__ == '__main__':
+    main()
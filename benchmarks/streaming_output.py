@@ -0,0 +1,80 @@
+"""Chunks per second for bulk output, one output_interrupt per chunk vs a stream.
+
+P processes each push K chunks to one transfer. The plain variant awaits every
+output_interrupt before sending the next chunk; the stream variant keeps up to
+--window chunks in flight through Process.stream().
+
+    python benchmarks/streaming_output.py --kind blocking --window 64
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ioscheduler
+
+
+def run(processes : int, chunks : int, kind : str, window : int, streamed : bool, mode : str):
+    state = {'done': 0}
+    scheduler = ioscheduler.Scheduler(mode)
+
+    class FreeSink(ioscheduler.FreeTransferHolder):
+        @staticmethod
+        async def stdout(transfer, data, request_uuid):
+            return 0, request_uuid
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= processes
+
+    class BlockingSink(ioscheduler.BlockingTransferHolder):
+        @staticmethod
+        async def stdout_batch(transfer, data_list):
+            return [0] * len(data_list)
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= processes
+
+    class Producer(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            if streamed == True:
+                async with process.stream(window) as stream:
+                    for i in range(chunks):
+                        await stream.send(i)
+            else:
+                for i in range(chunks):
+                    await process.output_interrupt(i)
+            process.locals['sent'] = True
+            state['done'] += 1
+
+        @staticmethod
+        def stop_condition(process):
+            return process.locals['sent']
+
+    scheduler.create_transfer(FreeSink if kind == 'free' else BlockingSink, None, 'sink')
+    for _ in range(processes):
+        scheduler.create_process(Producer, {'sent': False}, 'sink')
+    start = time.perf_counter()
+    scheduler.start()
+    return processes * chunks / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=10)
+    parser.add_argument('--chunks', type=int, default=2000)
+    parser.add_argument('--kind', choices=('free', 'blocking'), default='blocking')
+    parser.add_argument('--window', type=int, default=64)
+    parser.add_argument('--mode', default='wakeup')
+    args = parser.parse_args()
+    for streamed in (False, True):
+        rate = run(args.processes, args.chunks, args.kind, args.window, streamed, args.mode)
+        print(f"mode={args.mode} kind={args.kind} streamed={streamed} window={args.window} chunks_per_sec={rate:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Interrupt throughput and latency over a matrix of synthetic workloads.
+
+Each workload runs in its own interpreter so CPU time and peak RSS belong to
+that workload alone. N processes send K output or input interrupts each to M
+free or blocking transfers, tracked or no_track, against fast holders or ones
+that sleep for --latency, optionally replacing finished processes with new
+ones (churn). Results can be written as JSON and compared with an earlier run.
+
+    python benchmarks/suite.py --json results.json
+    python benchmarks/suite.py --only free-input blocking-input --compare results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import ioscheduler
+
+# name -> parameters, missing keys come from DEFAULTS
+WORKLOADS = {
+    'free-output': {'kind': 'free', 'interrupt': 'output'},
+    'free-input': {'kind': 'free', 'interrupt': 'input'},
+    'free-input-notrack': {'kind': 'free', 'interrupt': 'input', 'no_track': True},
+    'blocking-output': {'kind': 'blocking', 'interrupt': 'output'},
+    'blocking-input': {'kind': 'blocking', 'interrupt': 'input'},
+    'blocking-input-notrack': {'kind': 'blocking', 'interrupt': 'input', 'no_track': True},
+    'free-output-slow': {'kind': 'free', 'interrupt': 'output', 'processes': 200, 'messages': 5, 'latency': 0.001},
+    'blocking-output-slow': {'kind': 'blocking', 'interrupt': 'output', 'processes': 200, 'messages': 5, 'latency': 0.001},
+    'free-output-churn': {'kind': 'free', 'interrupt': 'output', 'processes': 100, 'messages': 2, 'generations': 20},
+}
+DEFAULTS = {'kind': 'free', 'interrupt': 'output', 'no_track': False, 'transfers': 4, 'processes': 1000,
+            'messages': 10, 'latency': 0.0, 'generations': 1, 'mode': 'wakeup'}
+
+
+def percentile(values : list, fraction : float):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_workload(params : dict):
+    total = params['processes'] * params['generations']
+    state = {'done': 0, 'created': 0, 'latencies': []}
+    scheduler = ioscheduler.Scheduler(params['mode'])
+    latency = params['latency']
+
+    async def serve():
+        if latency > 0: await asyncio.sleep(latency)
+
+    class FreeTransfer(ioscheduler.FreeTransferHolder):
+        @staticmethod
+        async def stdout(transfer, data, request_uuid):
+            await serve()
+            return 0, request_uuid
+
+        @staticmethod
+        async def stdin(transfer):
+            await serve()
+            return 1, 0, None
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= total
+
+    class BlockingTransfer(ioscheduler.BlockingTransferHolder):
+        @staticmethod
+        async def stdout(transfer, data):
+            await serve()
+            return 0
+
+        @staticmethod
+        async def stdin(transfer):
+            await serve()
+            return 1, 0
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= total
+
+    class Client(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            for i in range(params['messages']):
+                start = time.perf_counter()
+                if params['interrupt'] == 'output':
+                    await process.output_interrupt(i)
+                else:
+                    await process.input_interrupt(params['no_track'], proc_output=i)
+                state['latencies'].append(time.perf_counter() - start)
+            process.locals['sent'] = True
+            state['done'] += 1
+            if state['created'] < total: spawn()
+
+        @staticmethod
+        def stop_condition(process):
+            return process.locals['sent']
+
+    def spawn():
+        scheduler.create_process(Client, {'sent': False}, 't%d' % (state['created'] % params['transfers']))
+        state['created'] += 1
+
+    holder = FreeTransfer if params['kind'] == 'free' else BlockingTransfer
+    for i in range(params['transfers']):
+        scheduler.create_transfer(holder, None, 't%d' % i)
+    for _ in range(params['processes']):
+        spawn()
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    scheduler.start()
+    elapsed = time.perf_counter() - start
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    latencies = state['latencies']
+    return {
+        'messages_per_sec': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'cpu_sec': (after.ru_utime + after.ru_stime) - (usage.ru_utime + usage.ru_stime),
+        'peak_rss_mb': after.ru_maxrss / 1024, # kilobytes on Linux
+        'elapsed_sec': elapsed,
+        'messages': len(latencies),
+    }
+
+
+def run_isolated(params : dict):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', json.dumps(params)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--only', nargs='+', choices=sorted(WORKLOADS), default=None)
+    parser.add_argument('--mode', default=None, help='override the scheduler mode of every workload')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiply process counts')
+    parser.add_argument('--json', default=None, help='write results to this file')
+    parser.add_argument('--compare', default=None, help='earlier --json results to compare against')
+    parser.add_argument('--run-one', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one != None:
+        print(json.dumps(run_workload(json.loads(args.run_one))))
+        return
+
+    baseline = {}
+    if args.compare != None:
+        with open(args.compare) as f:
+            baseline = {result['name']: result for result in json.load(f)['results']}
+
+    results = []
+    for name in (args.only or WORKLOADS):
+        params = dict(DEFAULTS, **WORKLOADS[name])
+        if args.mode != None: params['mode'] = args.mode
+        params['processes'] = max(1, int(params['processes'] * args.scale))
+        result = dict(name=name, params=params, **run_isolated(params))
+        results.append(result)
+        line = (f"{name:24} msgs/s={result['messages_per_sec']:9.0f} p50={result['p50_ms']:8.2f}ms "
+                f"p99={result['p99_ms']:8.2f}ms cpu={result['cpu_sec']:6.2f}s rss={result['peak_rss_mb']:6.1f}MB")
+        if name in baseline:
+            line += f"  vs base x{result['messages_per_sec'] / baseline[name]['messages_per_sec']:.2f}"
+        print(line, flush=True)
+
+    if args.json != None:
+        with open(args.json, 'w') as f:
+            json.dump({'revision': revision(), 'python': sys.version.split()[0], 'time': time.time(), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Event loop iterations per second while many processes wait on a transfer.
+
+A transfer that never answers (is_stdout_available is False) holds N
+output interrupts open; a probe process counts how many times per second it
+gets through the event loop. Run against different checkouts to compare.
+
+    python benchmarks/waiting_interrupts.py --interrupts 10000 --mode wakeup
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ioscheduler
+
+
+def run(interrupts : int, window : float, mode : str):
+    state = {'posted': 0, 'probe_count': 0, 'done': False}
+
+    class SilentTransfer(ioscheduler.FreeTransferHolder):
+        @staticmethod
+        def is_stdout_available(transfer):
+            return False
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done']
+
+    class Waiter(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            state['posted'] += 1
+            await process.output_interrupt(process.pid)
+            process.locals['sent'] = True
+
+        @staticmethod
+        def stop_condition(process):
+            return process.locals['sent']
+
+    class Probe(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            while state['posted'] < interrupts: # let every waiter post its interrupt
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            while time.perf_counter() - start < window:
+                await asyncio.sleep(0)
+                state['probe_count'] += 1
+            process.locals['elapsed'] = time.perf_counter() - start
+            state['done'] = True
+
+        @staticmethod
+        def stop_condition(process):
+            return state['done']
+
+    ioscheduler.create_transfer(SilentTransfer, None, 'silent')
+    for _ in range(interrupts):
+        ioscheduler.create_process(Waiter, {'sent': False}, 'silent')
+    probe_locals = {}
+    ioscheduler.create_process(Probe, probe_locals, 'probe')
+    if mode == 'polling':
+        ioscheduler.start()
+    else:
+        ioscheduler.start(mode)
+    return state['probe_count'] / probe_locals['elapsed']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--interrupts', type=int, default=10000)
+    parser.add_argument('--window', type=float, default=3.0)
+    parser.add_argument('--mode', default='polling')
+    args = parser.parse_args()
+    rate = run(args.interrupts, args.window, args.mode)
+    print(f"mode={args.mode} interrupts={args.interrupts} loop_iterations_per_sec={rate:.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Task churn of the wakeup and worker scheduler modes.
+
+In wakeup mode every iteration the scheduler starts is a new asyncio task; in
+worker mode it resumes a coroutine parked on its transfer or process. N
+processes push K output interrupts each through T free transfers; the script
+counts tasks created through the loop's task factory, garbage collector runs
+and messages per second, each mode in its own interpreter.
+
+    python benchmarks/worker_mode.py --processes 1000 --messages 50
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ioscheduler
+
+
+def run(mode : str, processes : int, messages : int, transfers : int, concurrency : int):
+    state = {'done': 0, 'tasks': 0}
+    scheduler = ioscheduler.Scheduler(mode)
+
+    class Transfer(ioscheduler.FreeTransferHolder):
+        @staticmethod
+        async def stdout(transfer, data, request_uuid):
+            return 0, None
+
+        @staticmethod
+        def stop_condition(transfer):
+            return state['done'] >= processes
+    Transfer.concurrency = concurrency
+
+    class Client(ioscheduler.ProcessHolder):
+        @staticmethod
+        async def body(process):
+            for i in range(messages):
+                await process.output_interrupt(i)
+            process.locals['sent'] = True
+            state['done'] += 1
+
+        @staticmethod
+        def stop_condition(process):
+            return process.locals['sent']
+
+    for i in range(transfers):
+        scheduler.create_transfer(Transfer, None, 't%d' % i)
+
+    async def create_processes(): # process futures belong to the loop that runs the scheduler
+        for i in range(processes):
+            scheduler.create_process(Client, {'sent': False}, 't%d' % (i % transfers))
+
+    def task_factory(loop, coro):
+        state['tasks'] += 1
+        return asyncio.Task(coro, loop=loop)
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(create_processes())
+    loop.set_task_factory(task_factory)
+    collections_before = sum(stats['collections'] for stats in gc.get_stats())
+    cpu = time.process_time()
+    start = time.perf_counter()
+    loop.run_until_complete(scheduler.run())
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    loop.close()
+    total = processes * messages
+    return {
+        'mode': mode,
+        'messages_per_sec': total / elapsed,
+        'cpu_us_per_message': cpu / total * 1000000,
+        'tasks_per_message': state['tasks'] / total,
+        'gc_collections': sum(stats['collections'] for stats in gc.get_stats()) - collections_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=1000)
+    parser.add_argument('--messages', type=int, default=50)
+    parser.add_argument('--transfers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=4, help='stdout calls in flight per transfer')
+    parser.add_argument('--modes', nargs='+', default=['wakeup', 'worker'])
+    parser.add_argument('--run-one', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one != None:
+        print(json.dumps(run(args.run_one, args.processes, args.messages, args.transfers, args.concurrency)))
+        return
+
+    for mode in args.modes:
+        command = [sys.executable, os.path.abspath(__file__), '--run-one', mode, '--processes', str(args.processes),
+                   '--messages', str(args.messages), '--transfers', str(args.transfers), '--concurrency', str(args.concurrency)]
+        result = json.loads(subprocess.run(command, check=True, capture_output=True, text=True).stdout)
+        print(f"mode={mode:7} msgs/s={result['messages_per_sec']:9.0f} cpu/msg={result['cpu_us_per_message']:6.1f}us "
+              f"tasks/msg={result['tasks_per_message']:5.2f} gc_collections={result['gc_collections']}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
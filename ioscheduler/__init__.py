@@ -6,3 +6,21 @@ from .ioscheduler import Process
 from .ioscheduler import start
 from .ioscheduler import create_transfer
 from .ioscheduler import create_process
+from .ioscheduler import create_group
+from .ioscheduler import depth
+from .ioscheduler import set_classes
+from .ioscheduler import metrics
+from .ioscheduler import processes_alive
+from .ioscheduler import transfers_alive
+from .ioscheduler import to_prometheus
+from .ioscheduler import set_tracer
+from .ioscheduler import Scheduler
+from .sharding import ShardedScheduler
+from .tracing import RingBufferSink
+from .tracing import ChromeTraceSink
+from .buffers import BufferPool
+from .streams import StreamTransferHolder
+from .streams import UnixTransferHolder
+from .streams import TcpTransferHolder
+from .streams import PipeTransferHolder
+from .streams import serve_frames
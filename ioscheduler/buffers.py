@@ -0,0 +1,50 @@
+import contextlib
+
+
+class BufferPool:
+    # reusable bytearrays for binary payloads, pass memoryview(buffer)[:n] in interrupts
+    # a buffer may go back to the pool once the interrupt that carried it has returned
+    def __init__(self, buffer_size : int = 65536, max_free : int = 64):
+        if buffer_size < 1: raise Exception("Buffer size must be at least 1!")
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+        self.allocated = 0
+        self.reused = 0
+        self._free = [] # most recently released first out, still warm in cache
+        self._outstanding = {} # id -> pool buffer handed out and not released yet, held so its id can't be reused
+
+    def acquire(self, size : int = None):
+        if size != None and size > self.buffer_size: # one-off, not kept by release
+            self.allocated += 1
+            return bytearray(size)
+        if len(self._free) > 0:
+            self.reused += 1
+            buffer = self._free.pop()
+        else:
+            self.allocated += 1
+            buffer = bytearray(self.buffer_size)
+        self._outstanding[id(buffer)] = buffer
+        return buffer
+
+    def release(self, buffer : bytearray): # a second release would hand the same buffer to two payloads
+        if self._outstanding.get(id(buffer)) is not buffer:
+            if len(buffer) != self.buffer_size: return # one-off from acquire
+            raise Exception("Buffer was released twice or is not from this pool!")
+        del self._outstanding[id(buffer)]
+        if len(buffer) != self.buffer_size: raise Exception("Pool buffer was resized!") # dropped, the pool hands out buffer_size only
+        if len(self._free) >= self.max_free: return
+        self._free.append(buffer)
+
+    @contextlib.contextmanager
+    def borrow(self, size : int = None):
+        buffer = self.acquire(size)
+        try:
+            yield buffer
+        finally:
+            self.release(buffer)
+
+    def free_count(self):
+        return len(self._free)
+
+    def outstanding_count(self):
+        return len(self._outstanding)
@@ -1,5 +1,9 @@
 import asyncio
-import queue
+import bisect
+import collections
+import functools
+import os
+import time
 import uuid as ud
 from typing import Union
 
@@ -12,12 +16,15 @@ class _StdinCall:
         self.call_uuid = call_uuid
 
 class _StdoutCall:
-    __slots__ = ['data', 'proc_pid', 'call_uuid', 'tag']
-    def __init__(self, data, proc_pid : int, call_uuid, tag):
+    __slots__ = ['data', 'proc_pid', 'call_uuid', 'tag', 'priority', 'dropped', 'taken']
+    def __init__(self, data, proc_pid : int, call_uuid, tag, priority : str = 'default'):
         self.data = data
         self.tag = tag
         self.proc_pid = proc_pid
         self.call_uuid = call_uuid
+        self.priority = priority
+        self.dropped = False # interrupt expired or moved on, skipped if it is already out of the queues in a batch
+        self.taken = False # handed to the holder
 
 class _StderrCall:
     __slots__ = ['data', 'proc_pid', 'call_uuid', 'tag']
@@ -28,10 +35,263 @@ class _StderrCall:
         self.call_uuid = call_uuid
 
 
+def _offload_hook(holder, hook, entity, *args):
+    executor = holder.executor if holder.executor != None else entity._scheduler.executor
+    return asyncio.get_running_loop().run_in_executor(executor, functools.partial(hook, entity, *args))
+
+
+class _OffloadedHooks:
+    # hooks named in holder.offload run as plain functions in an executor and return a future
+    def __init__(self, holder):
+        self._holder = holder
+        for name in holder.offload:
+            setattr(self, name, functools.partial(_offload_hook, holder, getattr(holder, name)))
+
+    def __getattr__(self, name):
+        return getattr(self._holder, name)
+
+
+def _hooks_for(holder):
+    if len(getattr(holder, 'offload', ())) == 0: return holder
+    return _OffloadedHooks(holder)
+
+
+class _FairQueue:
+    # weighted fair queue over priority classes (stride scheduling), FIFO inside a class
+    __slots__ = ['_weights', '_stats', '_queues', '_passes', '_vtime', '_size']
+
+    def __init__(self, weights : dict, stats : dict = None):
+        self._weights = weights # class -> weight
+        self._stats = stats # class -> counters, records queue waits when given
+        self._queues = {} # class -> deque of (queued_at, item)
+        self._passes = {} # class -> virtual time of its next turn
+        self._vtime = 0.0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, item): # item.priority names the class
+        queue = self._queues.get(item.priority)
+        if queue == None: queue = self._queues[item.priority] = collections.deque()
+        if len(queue) == 0: # an idle class does not bank credit
+            self._passes[item.priority] = max(self._passes.get(item.priority, 0.0), self._vtime)
+        queue.append((time.perf_counter() if self._stats != None else 0, item))
+        self._size += 1
+
+    def extendleft(self, items): # puts items back at the front of their classes, like deque.extendleft
+        for item in items:
+            queue = self._queues.get(item.priority)
+            if queue == None: queue = self._queues[item.priority] = collections.deque()
+            if len(queue) == 0: self._passes[item.priority] = max(self._passes.get(item.priority, 0.0), self._vtime)
+            queue.appendleft((time.perf_counter() if self._stats != None else 0, item))
+            self._size += 1
+
+    def remove(self, item): # like deque.remove, the item leaves without counting as served
+        queue = self._queues.get(item.priority)
+        if queue != None:
+            for entry in queue:
+                if entry[1] is item:
+                    queue.remove(entry)
+                    self._size -= 1
+                    return
+        raise ValueError("item not in queue")
+
+    def _next_class(self): # class whose turn is next
+        best = None
+        for priority, queue in self._queues.items():
+            if len(queue) > 0 and (best == None or self._passes[priority] < self._passes[best]): best = priority
+        return best
+
+    def peek(self): # item popleft would return, without serving it
+        if self._size == 0: raise IndexError("peek at an empty queue")
+        return self._queues[self._next_class()][0][1]
+
+    def popleft(self):
+        if self._size == 0: raise IndexError("pop from an empty queue")
+        best = self._next_class()
+        queued_at, item = self._queues[best].popleft()
+        self._vtime = self._passes[best]
+        self._passes[best] += 1.0 / self._weights[best]
+        self._size -= 1
+        if self._stats != None:
+            wait = time.perf_counter() - queued_at
+            stats = self._stats[best]
+            stats['items'] += 1
+            stats['wait_total'] += wait
+            if wait > stats['wait_max']: stats['wait_max'] = wait
+        return item
+
+
+class _ReplyCache:
+    # reply cache for input interrupts of one transfer: identical requests in flight share one holder call (single-flight),
+    # answered ones are kept for ttl seconds, least recently used go first past size entries
+    __slots__ = ['_transfer', '_key', '_size', '_ttl', '_entries', '_flights', 'hits', 'misses', 'coalesced', 'evictions', 'key_errors']
+
+    def __init__(self, transfer, key, size : int, ttl : float):
+        if size < 1: raise Exception("Cache size must be at least 1!")
+        if ttl != None and ttl <= 0: raise Exception("Cache ttl must be positive!")
+        self._transfer = transfer
+        self._key = key # payload -> hashable key, None skips the cache
+        self._size = size
+        self._ttl = ttl
+        self._entries = collections.OrderedDict() # key -> (expires_at, stdin data, stderr data), oldest used first
+        self._flights = {} # key -> interrupts waiting on the one the holder was given
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.key_errors = 0 # payloads whose key raised or wasn't hashable, they skip the cache
+
+    def lookup(self, inter): # True when the interrupt is answered from the cache or joined a flight
+        try:
+            key = self._key(inter.proc_stdout.data)
+            hash(key)
+        except Exception: # runs inside the tick, a bad key must not stop the scheduler
+            self.key_errors += 1
+            return False
+        if key == None: return False
+        entry = self._entries.get(key)
+        if entry != None:
+            if entry[0] == None or entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                inter.transfer_stdin = _StdinCall(entry[1], inter.proc_pid, inter.interrupt_uuid, inter.proc_tag)
+                inter.transfer_stderr = _StderrCall(entry[2], inter.proc_pid, inter.interrupt_uuid, inter.proc_tag)
+                inter._trace('cache', 'hit')
+                inter._release()
+                return True
+            del self._entries[key]
+        followers = self._flights.get(key)
+        if followers != None:
+            followers.append(inter)
+            self.coalesced += 1
+            inter._trace('cache', 'coalesced')
+            return True
+        self._flights[key] = []
+        inter._flight = (self, key)
+        self.misses += 1
+        return False
+
+    def settle(self, key, leader = None): # followers of the flight, stores the leader's reply unless the transfer found it fatal
+        followers = self._flights.pop(key, ())
+        if leader == None: return followers
+        stderr_data = leader.transfer_stderr.data
+        fatal = self._transfer._hooks.is_fatal(self._transfer, stderr_data)
+        if asyncio.isfuture(fatal) or fatal == True: return followers # an offloaded is_fatal can't be waited for here, not cached
+        expires_at = time.monotonic() + self._ttl if self._ttl != None else None
+        self._entries[key] = (expires_at, leader.transfer_stdin.data, stderr_data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return followers
+
+    def snapshot(self):
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses, 'coalesced': self.coalesced, 'evictions': self.evictions,
+                'key_errors': self.key_errors}
+
+
+class _Histogram:
+    __slots__ = ['bounds', 'counts', 'sum', 'count']
+
+    def __init__(self, bounds : tuple):
+        self.bounds = bounds # upper bounds, the last bucket is +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value : float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {'bounds': list(self.bounds), 'counts': list(self.counts), 'sum': self.sum, 'count': self.count}
+
+
+_SECONDS_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class _Metrics:
+    # counters and histograms the scheduler keeps while running, read with Scheduler.metrics()
+    def __init__(self):
+        self.ticks = 0
+        self.tasks_spawned = 0
+        self.tick_seconds = _Histogram(_SECONDS_BUCKETS)
+        self.tasks_per_tick = _Histogram(_COUNT_BUCKETS)
+        self.interrupt_wait_seconds = _Histogram(_SECONDS_BUCKETS) # creation to release
+        self.interrupts = {'answered': 0, 'abandoned': 0, 'rejected': 0, 'timed_out': 0, 'cancelled': 0}
+        self.iteration_seconds = {} # (holder, iteration function) -> histogram
+
+
+def _prometheus_labels(labels : dict):
+    if len(labels) == 0: return ''
+    escaped = ('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels.items())
+    return '{' + ','.join(escaped) + '}'
+
+
+def _prometheus_histogram(lines : list, name : str, histogram : dict, labels : dict = {}):
+    cumulative = 0
+    for bound, count in zip(histogram['bounds'] + ['+Inf'], histogram['counts']):
+        cumulative += count
+        lines.append('%s_bucket%s %d' % (name, _prometheus_labels(dict(labels, le=bound)), cumulative))
+    lines.append('%s_sum%s %r' % (name, _prometheus_labels(labels), histogram['sum']))
+    lines.append('%s_count%s %d' % (name, _prometheus_labels(labels), histogram['count']))
+
+
+def to_prometheus(snapshot : dict):
+    lines = []
+    def header(name, kind):
+        lines.append('# TYPE %s %s' % (name, kind))
+    for name in ('transfers_alive', 'processes_alive'):
+        header('ioscheduler_' + name, 'gauge')
+        lines.append('ioscheduler_%s %d' % (name, snapshot[name]))
+    for name in ('ticks', 'tasks_spawned'):
+        header('ioscheduler_%s_total' % name, 'counter')
+        lines.append('ioscheduler_%s_total %d' % (name, snapshot[name]))
+    header('ioscheduler_interrupts_total', 'counter')
+    for outcome, count in snapshot['interrupts'].items():
+        lines.append('ioscheduler_interrupts_total%s %d' % (_prometheus_labels({'outcome': outcome}), count))
+    for name in ('tick_seconds', 'tasks_per_tick', 'interrupt_wait_seconds'):
+        header('ioscheduler_' + name, 'histogram')
+        _prometheus_histogram(lines, 'ioscheduler_' + name, snapshot[name])
+    header('ioscheduler_iteration_seconds', 'histogram')
+    for holder, calls in snapshot['iteration_seconds'].items():
+        for call, histogram in calls.items():
+            _prometheus_histogram(lines, 'ioscheduler_iteration_seconds', histogram, {'holder': holder, 'call': call})
+    header('ioscheduler_transfer_queue_depth', 'gauge')
+    for tag, queues in snapshot['transfers'].items():
+        for queue, depth in queues.items():
+            lines.append('ioscheduler_transfer_queue_depth%s %d' % (_prometheus_labels({'tag': tag, 'queue': queue}), depth))
+    for metric, name, kind in (('ioscheduler_class_items_total', 'items', 'counter'), ('ioscheduler_class_wait_seconds_total', 'wait_total', 'counter'),
+                               ('ioscheduler_class_wait_max_seconds', 'wait_max', 'gauge'), ('ioscheduler_class_iterations_total', 'iterations', 'counter'),
+                               ('ioscheduler_class_deferred_total', 'deferred', 'counter')):
+        header(metric, kind)
+        for priority, stats in snapshot['classes'].items():
+            lines.append('%s%s %r' % (metric, _prometheus_labels({'class': priority}), stats[name]))
+    header('ioscheduler_cache_entries', 'gauge')
+    for tag, stats in snapshot['caches'].items():
+        lines.append('ioscheduler_cache_entries%s %d' % (_prometheus_labels({'tag': tag}), stats['entries']))
+    header('ioscheduler_cache_total', 'counter')
+    for tag, stats in snapshot['caches'].items():
+        for outcome in ('hits', 'misses', 'coalesced', 'evictions', 'key_errors'):
+            lines.append('ioscheduler_cache_total%s %d' % (_prometheus_labels({'tag': tag, 'outcome': outcome}), stats[outcome]))
+    header('ioscheduler_group_dispatched_total', 'counter')
+    for group, stats in snapshot['groups'].items():
+        for member, count in stats['dispatched'].items():
+            lines.append('ioscheduler_group_dispatched_total%s %d' % (_prometheus_labels({'group': group, 'member': member}), count))
+    header('ioscheduler_group_failovers_total', 'counter')
+    for group, stats in snapshot['groups'].items():
+        lines.append('ioscheduler_group_failovers_total%s %d' % (_prometheus_labels({'group': group}), stats['failovers']))
+    return '\n'.join(lines) + '\n'
+
+
 class _SemaphoredList:
     __slots__ = ['_unsafe_list', '_viewing_count']
 
-    def __init__(self, unsafe_list : list):
+    def __init__(self, unsafe_list : Union[list, dict]):
         self._unsafe_list = unsafe_list
         self._viewing_count = 0
 
@@ -51,160 +311,340 @@ class _SemaphoredList:
 
 
 class Transfer:
-    _AllTransfers = _SemaphoredList([]) # static field
-    _AliveCount = 0 # static field
-
-    _alive = False
-    _stdout_in_iteration = False # only for free
-    _stdin_in_iteration = False # only for free
-    _stdinout_in_iteration = False # only for blocking
-    _in_init_state = False
-    _in_stop_state = False
-    _holder = None
-    _skip_next_iteration = False
-
-    locals = None
-    tag = None
-
-    def __init__(self, holder, locals : object, tag : str):
-        self._stdout = queue.Queue()
-        self._stdin = queue.Queue()
-        self._stdreq = queue.Queue()
-        self._stderr = queue.Queue()
+    __slots__ = ['_alive', '_stdout_in_flight', '_stdin_in_flight', '_stdinout_in_iteration', '_in_init_state', '_in_stop_state',
+                 '_holder', '_scheduler', '_hooks', '_blocking', '_skip_next_iteration', '_congested', '_refill_timer',
+                 '_stdout', '_stdin', '_stdreq', '_stderr', '_waiting', '_capacity', '_low_watermark', '_concurrency',
+                 '_rate', '_burst', '_tokens', '_refilled_at', '_fatal_at', '_cache', 'locals', 'tag']
+
+    def __init__(self, holder, locals : object, tag : str, scheduler):
+        self._stdout_in_flight = 0 # only for free
+        self._stdin_in_flight = 0 # only for free
+        self._stdinout_in_iteration = False # only for blocking
+        self._in_stop_state = False
+        self._skip_next_iteration = False
+        self._congested = False
+        self._refill_timer = None
+        self._fatal_at = None # monotonic time is_fatal last fired, groups route around the transfer for a cooldown
+        self._stdout = scheduler._new_queue()
+        self._stdin = collections.deque()
+        self._stdreq = scheduler._new_queue()
+        self._stderr = collections.deque()
+        self._waiting = collections.deque() # interrupts held back while congested
+        self._capacity = holder.capacity
+        self._low_watermark = holder.low_watermark
+        if self._capacity != None:
+            if self._capacity < 1: raise Exception("Transfer capacity must be at least 1!")
+            if self._low_watermark == None: self._low_watermark = self._capacity - 1
+            if self._low_watermark < 0 or self._low_watermark >= self._capacity: raise Exception("Low watermark must be below capacity!")
+        if holder.overflow not in ('wait', 'fail'): raise Exception("Unknown overflow policy!")
+        self._concurrency = getattr(holder, 'concurrency', 1)
+        if self._concurrency < 1: raise Exception("Transfer concurrency must be at least 1!")
+        self._rate = holder.rate
+        self._burst = holder.burst
+        if self._rate != None and self._rate <= 0: raise Exception("Transfer rate must be positive!")
+        if self._burst < 1: raise Exception("Transfer burst must be at least 1!")
+        self._tokens = float(self._burst)
+        self._refilled_at = time.monotonic()
+        self._cache = _ReplyCache(self, holder.cache_key, holder.cache_size, holder.cache_ttl) if holder.cache_key != None else None
         self._holder = holder
+        self._scheduler = scheduler
+        self._hooks = _hooks_for(holder)
+        self._blocking = issubclass(holder, BlockingTransferHolder)
         self.locals = locals
         self.tag = tag
         self._in_init_state = True
         self._alive = True
-        Transfer._AliveCount += 1
+        scheduler._transfers_alive += 1
+        self.wake()
 
     @staticmethod
-    def create_transfer(holder, locals : object, tag : str):
-        self_transfer = Transfer(holder, locals, tag)
-        Transfer._AllTransfers._join()
-        allTransfers = Transfer._AllTransfers._open_list()
-        for tr in allTransfers:
-            if tr.tag == self_transfer.tag:
-                raise Exception("Can't create second transfer with the same tag!")
-        allTransfers.append(self_transfer)
-        Transfer._AllTransfers._close_list()
+    def create_transfer(holder, locals : object, tag : str, scheduler = None):
+        if scheduler == None: scheduler = _default_scheduler
+        scheduler.create_transfer(holder, locals, tag)
 
     async def _stdout_iteration_call(self):
-        self._stdout_in_iteration = True
+        self._stdout_in_flight += 1
 
         if self._in_init_state == True:
-            await self._holder.on_start(self)
+            await self._hooks.on_start(self)
             self._in_init_state = False
-            self._stdout_in_iteration = False
-            return
-        if self._holder.stop_condition(self) == True and self._in_stop_state == False:
+            self._stdout_in_flight -= 1
+            return True
+        stop = self._hooks.stop_condition(self)
+        if asyncio.isfuture(stop): stop = await stop
+        if stop == True and self._in_stop_state == False:
             self._in_stop_state = True
             await self.stop()
-            self._stdout_in_iteration = False
-            return
-        if self._stdout.empty() == True or self._holder.is_stdout_available(self) != True:
-            self._stdout_in_iteration = False
-            return
-        first_stdout_call = self._stdout.get()
+            self._stdout_in_flight -= 1
+            return True
+        available = len(self._stdout) > 0 and self._hooks.is_stdout_available(self)
+        if asyncio.isfuture(available): available = await available
+        if available != True or len(self._stdout) == 0 or self._take_tokens(1) == 0: # a concurrent call may have taken the last one
+            self._stdout_in_flight -= 1
+            return False
+        first_stdout_call = self._stdout.popleft()
+        first_stdout_call.taken = True
         request_pid = None
-        stderr_return, request_uuid = await self._holder.stdout(self, first_stdout_call.data, first_stdout_call.call_uuid)
+        tracing = self._scheduler.tracer != None
+        if tracing == True: self._trace('holder_start', first_stdout_call, 'stdout')
+        stderr_return, request_uuid = await self._hooks.stdout(self, first_stdout_call.data, first_stdout_call.call_uuid)
+        if tracing == True: self._trace('holder_end', first_stdout_call, 'stdout')
         if request_uuid == None: request_pid = first_stdout_call.proc_pid
-        self._stderr.put(_StderrCall(stderr_return, request_pid, request_uuid, self.tag))
-        if self._holder.is_fatal(self, stderr_return) == True:
-            await self._holder.on_fatal(self)
+        self._stderr.append(_StderrCall(stderr_return, request_pid, request_uuid, self.tag))
+        fatal = self._hooks.is_fatal(self, stderr_return)
+        if asyncio.isfuture(fatal): fatal = await fatal
+        if fatal == True:
+            await self._on_fatal()
 
-        self._stdout_in_iteration = False
+        self._stdout_in_flight -= 1
+        return True
 
 
     async def _stdin_iteration_call(self):
-        self._stdin_in_iteration = True
+        self._stdin_in_flight += 1
         if self._in_init_state == True:
-            self._stdin_in_iteration = False
-            return
+            self._stdin_in_flight -= 1
+            return False
         if self._in_stop_state == True:
-            self._stdin_in_iteration = False
-            return
-        if self._stdreq.empty() == True or self._holder.is_stdin_available(self) != True:
-            self._stdin_in_iteration = False
-            return
-        first_stdreq_call = self._stdreq.get()
+            self._stdin_in_flight -= 1
+            return False
+        available = len(self._stdreq) > 0 and self._hooks.is_stdin_available(self)
+        if asyncio.isfuture(available): available = await available
+        if available != True or len(self._stdreq) == 0 or self._take_tokens(1) == 0:
+            self._stdin_in_flight -= 1
+            return False
+        first_stdreq_call = self._stdreq.popleft()
+        first_stdreq_call.taken = True
         request_pid = None
-        stdin_return, stderr_return, request_uuid = await self._holder.stdin(self)
+        tracing = self._scheduler.tracer != None
+        if tracing == True: self._trace('holder_start', first_stdreq_call, 'stdin')
+        stdin_return, stderr_return, request_uuid = await self._hooks.stdin(self)
+        if tracing == True: self._trace('holder_end', first_stdreq_call, 'stdin')
         if request_uuid == None: request_pid = first_stdreq_call.proc_pid
-        self._stderr.put(_StderrCall(stderr_return, request_pid, request_uuid, self.tag))
-        self._stdin.put(_StdinCall(stdin_return, request_pid, request_uuid, self.tag))
-        if self._holder.is_fatal(self, stderr_return) == True:
-            await self._holder.on_fatal(self)
-
-        self._stdin_in_iteration = False
+        self._stderr.append(_StderrCall(stderr_return, request_pid, request_uuid, self.tag))
+        self._stdin.append(_StdinCall(stdin_return, request_pid, request_uuid, self.tag))
+        fatal = self._hooks.is_fatal(self, stderr_return)
+        if asyncio.isfuture(fatal): fatal = await fatal
+        if fatal == True:
+            await self._on_fatal()
+
+        self._stdin_in_flight -= 1
+        return True
 
     async def _stdinout_iteration_call(self): # only for blocking
         if self._skip_next_iteration == True:
             self._skip_next_iteration = False
-            return
+            return True
         self._stdinout_in_iteration = True
         if self._in_init_state == True:
-            await self._holder.on_start(self)
+            await self._hooks.on_start(self)
             self._in_init_state = False
             self._stdinout_in_iteration = False
-            return
-        if self._holder.stop_condition(self) == True and self._in_stop_state == False:
+            return True
+        stop = self._hooks.stop_condition(self)
+        if asyncio.isfuture(stop): stop = await stop
+        if stop == True and self._in_stop_state == False:
             self._in_stop_state = True
             await self.stop()
             self._stdinout_in_iteration = False
-            return
-        if self._stdout.empty() == False and self._holder.is_stdout_available(self) == True:
-            all_stdout_data = queue.Queue()
-            while self._stdout.empty() != True:
-                all_stdout_data.put(self._stdout.get())
-            while all_stdout_data.empty() != True:
-                first_stdout_call = all_stdout_data.get()
-                stderr_return = await self._holder.stdout(self, first_stdout_call.data)
-                self._stderr.put(_StderrCall(stderr_return, first_stdout_call.proc_pid, None, self.tag))
-                if self._holder.is_fatal(self, stderr_return) == True:
-                    await self._holder.on_fatal(self)
-                    break
-        if self._stdreq.empty() == False and self._holder.is_stdin_available(self) == True:
+            return True
+        progress = False
+        available = len(self._stdout) > 0 and self._hooks.is_stdout_available(self)
+        if asyncio.isfuture(available): available = await available
+        granted = self._take_tokens(len(self._stdout)) if available == True else 0
+        if granted > 0:
+            progress = True
+            all_stdout_data, self._stdout = self._take_batch(self._stdout, granted) # new calls queue up behind the batch
+            tracing = self._scheduler.tracer != None
+            if self._holder.stdout_batch != None:
+                await self._stdout_batch_call(all_stdout_data)
+            else:
+                while len(all_stdout_data) > 0:
+                    first_stdout_call = all_stdout_data.popleft()
+                    if first_stdout_call.dropped == True: continue # expired while the ones before it were served
+                    first_stdout_call.taken = True
+                    if tracing == True: self._trace('holder_start', first_stdout_call, 'stdout')
+                    stderr_return = await self._hooks.stdout(self, first_stdout_call.data)
+                    if tracing == True: self._trace('holder_end', first_stdout_call, 'stdout')
+                    self._stderr.append(_StderrCall(stderr_return, first_stdout_call.proc_pid, None, self.tag))
+                    fatal = self._hooks.is_fatal(self, stderr_return)
+                    if asyncio.isfuture(fatal): fatal = await fatal
+                    if fatal == True:
+                        self._requeue(self._stdout, all_stdout_data) # the rest of the batch goes first next time
+                        await self._on_fatal()
+                        break
+        available = len(self._stdreq) > 0 and self._hooks.is_stdin_available(self)
+        if asyncio.isfuture(available): available = await available
+        granted = self._take_tokens(len(self._stdreq)) if available == True else 0
+        if granted > 0:
+            progress = True
             self._skip_next_iteration = True
-            all_stdreq_data = queue.Queue()
-            while self._stdreq.empty() != True:
-                all_stdreq_data.put(self._stdreq.get())
-            while all_stdreq_data.empty() != True:
-                first_stdin_awaits = all_stdreq_data.get()
-                stderr_return = await self._holder.stdout(self, first_stdin_awaits.data)
-                if self._holder.is_fatal(self, stderr_return) == True:
-                    self._stderr.put(_StderrCall(stderr_return, first_stdin_awaits.proc_pid, None, self.tag))
-                    self._stdin.put(_StdinCall(None, first_stdin_awaits.proc_pid, None, self.tag))
-                    await self._holder.on_fatal(self)
-                    break
-                stdin_return, stderr_return = await self._holder.stdin(self)
-                self._stderr.put(_StderrCall(stderr_return, first_stdin_awaits.proc_pid, None, self.tag))
-                self._stdin.put(_StdinCall(stdin_return, first_stdin_awaits.proc_pid, None, self.tag))
-                if self._holder.is_fatal(self, stderr_return) == True:
-                    await self._holder.on_fatal(self)
-                    break
+            all_stdreq_data, self._stdreq = self._take_batch(self._stdreq, granted)
+            tracing = self._scheduler.tracer != None
+            if self._holder.stdin_batch != None:
+                await self._stdin_batch_call(all_stdreq_data)
+            else:
+                while len(all_stdreq_data) > 0:
+                    first_stdin_awaits = all_stdreq_data.popleft()
+                    if first_stdin_awaits.dropped == True: continue
+                    first_stdin_awaits.taken = True
+                    if tracing == True: self._trace('holder_start', first_stdin_awaits, 'stdout')
+                    stderr_return = await self._hooks.stdout(self, first_stdin_awaits.data)
+                    if tracing == True: self._trace('holder_end', first_stdin_awaits, 'stdout')
+                    fatal = self._hooks.is_fatal(self, stderr_return)
+                    if asyncio.isfuture(fatal): fatal = await fatal
+                    if fatal == True:
+                        self._stderr.append(_StderrCall(stderr_return, first_stdin_awaits.proc_pid, None, self.tag))
+                        self._stdin.append(_StdinCall(None, first_stdin_awaits.proc_pid, None, self.tag))
+                        self._requeue(self._stdreq, all_stdreq_data)
+                        await self._on_fatal()
+                        break
+                    if tracing == True: self._trace('holder_start', first_stdin_awaits, 'stdin')
+                    stdin_return, stderr_return = await self._hooks.stdin(self)
+                    if tracing == True: self._trace('holder_end', first_stdin_awaits, 'stdin')
+                    self._stderr.append(_StderrCall(stderr_return, first_stdin_awaits.proc_pid, None, self.tag))
+                    self._stdin.append(_StdinCall(stdin_return, first_stdin_awaits.proc_pid, None, self.tag))
+                    fatal = self._hooks.is_fatal(self, stderr_return)
+                    if asyncio.isfuture(fatal): fatal = await fatal
+                    if fatal == True:
+                        self._requeue(self._stdreq, all_stdreq_data)
+                        await self._on_fatal()
+                        break
         self._stdinout_in_iteration = False
+        return progress
+
+    def _take_tokens(self, wanted : int): # how many items may go to the holder now, arms a wakeup for the rest
+        if self._rate == None: return wanted
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._refilled_at) * self._rate)
+        self._refilled_at = now
+        granted = min(wanted, int(self._tokens))
+        self._tokens -= granted
+        if granted < wanted and self._refill_timer == None:
+            self._refill_timer = asyncio.get_running_loop().call_later((1 - self._tokens) / self._rate, self._refill)
+        return granted
+
+    def _refill(self):
+        self._refill_timer = None
+        self.wake()
+
+    @staticmethod
+    def _take_batch(queue, count : int): # (first count items, rest of the queue), each is taken when it reaches the holder
+        if count >= len(queue) and type(queue) is collections.deque: return queue, collections.deque()
+        return collections.deque(queue.popleft() for _ in range(0, count)), queue
+
+    @staticmethod
+    def _requeue(queue, calls : collections.deque): # calls the holder never got go back to the front
+        queue.extendleft(reversed([call for call in calls if call.dropped == False]))
+
+    def _withdraw(self, call : _StdoutCall): # a call the holder hasn't taken leaves the queues, depth and capacity see it at once
+        call.dropped = True
+        for queue in (self._stdout, self._stdreq):
+            try:
+                queue.remove(call)
+            except ValueError:
+                pass # not queued here, or out with a batch that skips it
+        if self._congested == True: self.wake() # may be back under the low watermark
+
+    async def _on_fatal(self):
+        self._fatal_at = time.monotonic()
+        if self.tag in self._scheduler._member_of: # queued interrupts move to healthy members
+            self._scheduler._failed_members.append(self)
+            self._scheduler._wake()
+        await self._hooks.on_fatal(self)
+
+    async def _stdout_batch_call(self, stdout_calls : collections.deque): # only for blocking
+        for call in stdout_calls: call.taken = True
+        self._trace_batch('holder_start', stdout_calls, 'stdout_batch')
+        stderr_returns = await self._hooks.stdout_batch(self, [call.data for call in stdout_calls])
+        self._trace_batch('holder_end', stdout_calls, 'stdout_batch')
+        if len(stderr_returns) != len(stdout_calls): raise Exception("stdout_batch must return one code per item!")
+        for stdout_call, stderr_return in zip(stdout_calls, stderr_returns):
+            self._stderr.append(_StderrCall(stderr_return, stdout_call.proc_pid, None, self.tag))
+        await self._batch_fatal_check(stderr_returns)
+
+    async def _stdin_batch_call(self, stdreq_calls : collections.deque): # only for blocking
+        for call in stdreq_calls: call.taken = True
+        self._trace_batch('holder_start', stdreq_calls, 'stdin_batch')
+        results = await self._hooks.stdin_batch(self, [call.data for call in stdreq_calls])
+        self._trace_batch('holder_end', stdreq_calls, 'stdin_batch')
+        if len(results) != len(stdreq_calls): raise Exception("stdin_batch must return one result per item!")
+        for stdreq_call, (stdin_return, stderr_return) in zip(stdreq_calls, results):
+            self._stderr.append(_StderrCall(stderr_return, stdreq_call.proc_pid, None, self.tag))
+            self._stdin.append(_StdinCall(stdin_return, stdreq_call.proc_pid, None, self.tag))
+        await self._batch_fatal_check([stderr_return for _, stderr_return in results])
+
+    def _trace(self, event : str, call : _StdoutCall, detail : str = None):
+        self._scheduler.tracer.emit(event, time.perf_counter(), call.proc_pid, self.tag, call.call_uuid, detail)
+
+    def _trace_batch(self, event : str, calls : collections.deque, detail : str):
+        tracer = self._scheduler.tracer
+        if tracer == None: return
+        now = time.perf_counter()
+        for call in calls:
+            tracer.emit(event, now, call.proc_pid, self.tag, call.call_uuid, detail)
+
+    async def _batch_fatal_check(self, stderr_returns : list): # on_fatal runs once per batch
+        for stderr_return in stderr_returns:
+            fatal = self._hooks.is_fatal(self, stderr_return)
+            if asyncio.isfuture(fatal): fatal = await fatal
+            if fatal == True:
+                await self._on_fatal()
+                return
 
     async def stop(self):
-        await self._holder.on_stop(self)
+        await self._hooks.on_stop(self)
+        if self._refill_timer != None: self._refill_timer.cancel()
         self._alive = False
-        Transfer._AliveCount -= 1
+        self._scheduler._transfers_alive -= 1
+        self._scheduler._dead_transfers.append(self)
+        self._scheduler._wake()
+
+    def wake(self): # marks transfer ready, predicates are checked again on the next tick
+        self._scheduler._ready_transfers[self] = None
+        self._scheduler._wake()
 
     def is_alive(self):
         return self._alive
 
     def is_stdout(self):
-        return self._stdout_in_iteration
+        return self._stdout_in_flight > 0
 
     def is_stdin(self):
-        return self._stdin_in_iteration
+        return self._stdin_in_flight > 0
 
     def is_stdinout(self): # only for blocking
         return self._stdinout_in_iteration
 
+    def _busy(self):
+        return self._stdout_in_flight > 0 or self._stdin_in_flight > 0 or self._stdinout_in_iteration
+
+    def depth(self): # items queued for the holder
+        return len(self._stdout) + len(self._stdreq)
+
+    def waiting(self): # interrupts held back by backpressure
+        return len(self._waiting)
+
+    def is_congested(self):
+        return self._congested
+
+    def __getstate__(self): # hooks offloaded to a process pool get a detached snapshot
+        return None, {'locals': self.locals, 'tag': self.tag}
+
 
 
 class BlockingTransferHolder:
+    offload = () # hook names to run as plain functions in executor
+    executor = None # concurrent.futures executor for offloaded hooks, None uses the scheduler's
+    capacity = None # queued items before new interrupts are held back, None is unbounded
+    low_watermark = None # depth at which held interrupts are admitted again, None is capacity - 1
+    overflow = 'wait' # 'wait' holds interrupts until the queue drains, 'fail' raises in the process
+    rate = None # items handed to the holder per second, None is unlimited
+    burst = 1 # items the token bucket holds, how many may go at once after a pause
+    cache_key = None # opt-in reply cache for input interrupts, function(data) -> hashable key, a None key skips the cache
+    cache_size = 1024 # cached replies kept, least recently used go first
+    cache_ttl = None # seconds a cached reply stays fresh, None keeps it until evicted
+
     ### rewrite functions ###
     @staticmethod
     async def stdout(transfer : Transfer, data):
@@ -214,6 +654,12 @@ class BlockingTransferHolder:
     async def stdin(transfer : Transfer):
         return None, None
 
+    # optional, replace with async functions to get all pending items at once:
+    # stdout_batch(transfer, data_list) -> [stderr, ...]
+    # stdin_batch(transfer, data_list) -> [(stdin, stderr), ...]
+    stdout_batch = None
+    stdin_batch = None
+
     @staticmethod
     async def on_fatal(transfer : Transfer):
         return
@@ -245,6 +691,18 @@ class BlockingTransferHolder:
 
 
 class FreeTransferHolder:
+    offload = () # hook names to run as plain functions in executor
+    executor = None # concurrent.futures executor for offloaded hooks, None uses the scheduler's
+    capacity = None # queued items before new interrupts are held back, None is unbounded
+    low_watermark = None # depth at which held interrupts are admitted again, None is capacity - 1
+    overflow = 'wait' # 'wait' holds interrupts until the queue drains, 'fail' raises in the process
+    rate = None # items handed to the holder per second, None is unlimited
+    burst = 1 # items the token bucket holds, how many may go at once after a pause
+    cache_key = None # opt-in reply cache for input interrupts, function(data) -> hashable key, a None key skips the cache
+    cache_size = 1024 # cached replies kept, least recently used go first
+    cache_ttl = None # seconds a cached reply stays fresh, None keeps it until evicted
+    concurrency = 1 # stdout and stdin calls allowed in flight at once, each
+
     ### rewrite functions ###
     @staticmethod
     async def stdout(transfer : Transfer, data, request_uuid : str):
@@ -286,87 +744,119 @@ class FreeTransferHolder:
 
 
 class Process:
-    _AllProcesses = _SemaphoredList([]) # static field
-    _AliveCount = 0 # static field
-    _NextPid = 1
-    _alive = False
-    _in_iteration = False
-    _in_init_state = False
-    _in_stop_state = False
-
-    locals = None
-    tag = None
-    pid = None
-    _interrupt = None
-    return_value = None
-    _holder = None
-
-    def __init__(self, holder, locals : object, tag : str):
-        self.pid = Process._NextPid
-        Process._NextPid += 1
-        if Process._NextPid >= 1000: Process._NextPid = 1
+    __slots__ = ['_alive', '_in_iteration', '_in_init_state', '_in_stop_state', '_interrupt', '_holder', '_scheduler', '_hooks',
+                 'locals', 'tag', 'pid', 'return_value', 'priority', 'my_future']
+
+    def __init__(self, holder, locals : object, tag : str, scheduler, priority : str = 'default'):
+        if priority not in scheduler.classes: raise Exception("Unknown priority class!")
+        self._in_iteration = False
+        self._in_stop_state = False
+        self._interrupt = None
+        self.return_value = None
+        self.pid = scheduler._allocate_pid()
+        self.priority = priority
         self._holder = holder
+        self._scheduler = scheduler
+        self._hooks = _hooks_for(holder)
         self.locals = locals
         self.tag = tag
         self._alive = True
         self._in_init_state = True
-        self.my_future = asyncio.Future()
-        Process._AliveCount += 1
+        self.my_future = scheduler._loop().create_future() # resolved on the loop the scheduler runs on
+        scheduler._processes_alive += 1
+        self.wake()
 
     @staticmethod
-    def create_process(holder, locals : object, tag : str):
-        self_process = Process(holder, locals, tag)
-        Process._AllProcesses._join()
-        allProcesses = Process._AllProcesses._open_list()
-        allProcesses.append(self_process)
-        Process._AllProcesses._close_list()
-        return self_process.my_future
+    def create_process(holder, locals : object, tag : str, scheduler = None, priority : str = 'default'):
+        if scheduler == None: scheduler = _default_scheduler
+        return scheduler.create_process(holder, locals, tag, priority)
 
     async def _body_iteration_call(self):
         self._in_iteration = True
         if self._in_init_state == True:
-            await self._holder.on_start(self)
+            await self._hooks.on_start(self)
             self._in_init_state = False
             self._in_iteration = False
-            return
-        if self._holder.stop_condition(self) == True and self._in_stop_state == False:
+            return True
+        stop = self._hooks.stop_condition(self)
+        if asyncio.isfuture(stop): stop = await stop
+        if stop == True and self._in_stop_state == False:
             self._in_stop_state = True
             await self.stop()
             self._in_iteration = False
-            return
-        if self._holder.is_body_available(self) != True:
+            return True
+        available = self._hooks.is_body_available(self)
+        if asyncio.isfuture(available): available = await available
+        if available != True:
             self._in_iteration = False
-            return
-        return_value = await self._holder.body(self)
+            return False
+        return_value = await self._hooks.body(self)
         self.return_value = return_value
-        if self._holder.is_fatal(self, return_value):
-            await self._holder.on_fatal(self)
+        fatal = self._hooks.is_fatal(self, return_value)
+        if asyncio.isfuture(fatal): fatal = await fatal
+        if fatal:
+            await self._hooks.on_fatal(self)
         self._in_iteration = False
+        return True
 
-    async def output_interrupt(self, proc_output : object = None, track_uuid : str = ud.uuid4().hex[:20]):
-        self._interrupt = _Interrupt(self.pid, self.tag, False, False, track_uuid, proc_output)
-        while self._interrupt.freeze == True:
-            await asyncio.sleep(0)
-        code = self._interrupt.transfer_stderr
-        self._interrupt = None
+    async def output_interrupt(self, proc_output : object = None, track_uuid : str = None, priority : str = None, timeout : float = None, deadline : float = None):
+        if track_uuid == None: track_uuid = ud.uuid4().hex[:20]
+        if priority == None: priority = self.priority
+        elif priority not in self._scheduler.classes: raise Exception("Unknown priority class!")
+        self._interrupt = _Interrupt(self._scheduler, self.pid, self.tag, False, False, track_uuid, proc_output, priority)
+        try:
+            await self._await_interrupt(timeout, deadline)
+            code = self._interrupt.transfer_stderr
+        finally:
+            self._interrupt = None
         return code.data
 
-    async def input_interrupt(self, no_track : bool = False, track_uuid : str = ud.uuid4().hex[:20], proc_output = None):
-        self._interrupt = _Interrupt(self.pid, self.tag, no_track, True, track_uuid, proc_output)
-        while self._interrupt.freeze == True:
-            await asyncio.sleep(0)
-        data, code = self._interrupt.transfer_stdin, self._interrupt.transfer_stderr
-        self._interrupt = None
+    async def input_interrupt(self, no_track : bool = False, track_uuid : str = None, proc_output = None, priority : str = None, timeout : float = None, deadline : float = None):
+        if track_uuid == None: track_uuid = ud.uuid4().hex[:20]
+        if priority == None: priority = self.priority
+        elif priority not in self._scheduler.classes: raise Exception("Unknown priority class!")
+        self._interrupt = _Interrupt(self._scheduler, self.pid, self.tag, no_track, True, track_uuid, proc_output, priority)
+        try:
+            await self._await_interrupt(timeout, deadline)
+            data, code = self._interrupt.transfer_stdin, self._interrupt.transfer_stderr
+        finally:
+            self._interrupt = None
         return data.data, code.data
 
+    async def _await_interrupt(self, timeout : float, deadline : float): # raises asyncio.TimeoutError once timeout seconds or the loop.time() deadline pass
+        inter = self._interrupt
+        if timeout != None:
+            expires = asyncio.get_running_loop().time() + timeout
+            if deadline == None or expires < deadline: deadline = expires
+        if deadline != None: inter._timer = asyncio.get_running_loop().call_at(deadline, inter._expire, 'timed_out')
+        try:
+            await inter.future
+        except asyncio.CancelledError:
+            inter._expire('cancelled')
+            raise
+        inter._trace('resumed')
+
     async def return_interrupt(self, future_to_await : asyncio.Future):
         return await future_to_await
 
+    def stream(self, window : int = None, priority : str = None, timeout : float = None): # async with process.stream() as s: await s.send(chunk)
+        if window != None and window < 1: raise Exception("Stream window must be at least 1!")
+        if timeout != None and timeout <= 0: raise Exception("Stream timeout must be positive!")
+        if priority == None: priority = self.priority
+        elif priority not in self._scheduler.classes: raise Exception("Unknown priority class!")
+        return _OutputStream(self, window, priority, timeout)
+
     async def stop(self):
         self.my_future.set_result(self.return_value)
-        await self._holder.on_stop(self)
+        await self._hooks.on_stop(self)
         self._alive = False
-        Process._AliveCount -= 1
+        self._scheduler._processes_alive -= 1
+        self._scheduler._dead_processes.append(self)
+        self._scheduler._wake()
+
+    def wake(self): # marks process ready, predicates are checked again on the next tick
+        self._scheduler._ready_processes[self] = None
+        self._scheduler._wake()
 
     def is_alive(self):
         return self._alive
@@ -374,8 +864,96 @@ class Process:
     def is_iteration(self):
         return self._in_iteration
 
+    def _busy(self):
+        return self._in_iteration
+
+    def __getstate__(self): # hooks offloaded to a process pool get a detached snapshot
+        return None, {'locals': self.locals, 'tag': self.tag, 'pid': self.pid, 'return_value': self.return_value}
+
+
+class _OutputStream:
+    # output interrupts sent without waiting for each reply, at most window of them in flight
+    # a chunk not answered within timeout seconds of its send raises asyncio.TimeoutError like output_interrupt,
+    # and chunks the holder hasn't taken are withdrawn when the block raises or is cancelled
+    def __init__(self, process : Process, window : int, priority : str, timeout : float):
+        self._process = process
+        self._window = window
+        self._priority = priority
+        self._timeout = timeout
+        self._pending = collections.deque() # interrupts in send order
+        self._reported = False
+        self.codes = [] # stderr codes of answered chunks, in send order
+        self.failed = False
+        self.error = None # first code the transfer's is_fatal accepted
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type != None:
+            self._withdraw()
+            return False
+        first_exception = None
+        try:
+            while len(self._pending) > 0:
+                try:
+                    await self._reap()
+                except Exception as e:
+                    if first_exception == None: first_exception = e
+        except asyncio.CancelledError:
+            self._withdraw()
+            raise
+        if first_exception != None: raise first_exception
+        self._raise_error()
+        return False
+
+    async def send(self, chunk, timeout : float = None): # timeout overrides the stream's for this chunk
+        self._raise_error()
+        process = self._process
+        inter = _Interrupt(process._scheduler, process.pid, process.tag, False, False, ud.uuid4().hex[:20], chunk, self._priority)
+        if timeout == None: timeout = self._timeout
+        if timeout != None: inter._timer = asyncio.get_running_loop().call_later(timeout, inter._expire, 'timed_out')
+        self._pending.append(inter)
+        while len(self._pending) > 0 and (self._pending[0].future.done() == True or (self._window != None and len(self._pending) > self._window)):
+            await self._reap()
+        self._raise_error()
+
+    def _withdraw(self): # expires what is still pending, the holder never sees chunks it hasn't taken
+        while len(self._pending) > 0:
+            inter = self._pending.popleft()
+            inter._expire('cancelled')
+            if inter.future.done() == True and inter.future.cancelled() == False: inter.future.exception() # nobody awaits it now
+
+    async def _reap(self):
+        inter = self._pending[0]
+        try:
+            await inter.future
+        finally:
+            if inter.future.cancelled() == False: self._pending.popleft() # cancelled with the caller, it stays for _withdraw
+        inter._trace('resumed')
+        code = inter.transfer_stderr.data
+        self.codes.append(code)
+        if self.failed == False and await self._is_fatal(inter.proc_tag, code) == True:
+            self.failed = True
+            self.error = code
+
+    async def _is_fatal(self, tag : str, code): # tag of the transfer that answered, a member when the process talks to a group
+        tr = self._process._scheduler._transfers._unsafe_list.get(tag)
+        if tr == None: return False # owned by another shard or gone
+        fatal = tr._hooks.is_fatal(tr, code)
+        if asyncio.isfuture(fatal): fatal = await fatal
+        return fatal
+
+    def _raise_error(self): # a fatal code is raised once, from send or from the end of the block
+        if self.failed == False or self._reported == True: return
+        self._reported = True
+        raise Exception("Transfer reported a fatal code %r!" % (self.error,))
+
 
 class ProcessHolder:
+    offload = () # hook names to run as plain functions in executor
+    executor = None # concurrent.futures executor for offloaded hooks, None uses the scheduler's
+
 ### rewrite functions ###
     @staticmethod
     async def body(process : Process):
@@ -408,158 +986,651 @@ class ProcessHolder:
 
 
 class _Interrupt:
-    _AllInterrupts = _SemaphoredList([]) # static field
-    def __init__(self, process_pid : int, process_tag, no_track : bool, expects_input : bool, track_uuid : str, proc_stdout = None):
+    __slots__ = ['_scheduler', 'expects_input', 'proc_pid', 'proc_tag', 'no_track', 'interrupt_uuid', 'proc_stdout',
+                 'transfer_stdin', 'transfer_stderr', 'in_progress', 'freeze', 'created_at', 'future', 'expired', '_timer', '_flight']
+
+    def __init__(self, scheduler, process_pid : int, process_tag, no_track : bool, expects_input : bool, track_uuid : str, proc_stdout = None, priority : str = 'default'):
+        self._scheduler = scheduler
         self.expects_input = expects_input
         self.proc_pid = process_pid
         self.proc_tag = process_tag
         self.no_track = no_track
         self.interrupt_uuid = track_uuid
 
-        self.proc_stdout = _StdoutCall(proc_stdout, process_pid, self.interrupt_uuid, process_tag)
+        self.proc_stdout = _StdoutCall(proc_stdout, process_pid, self.interrupt_uuid, process_tag, priority)
         self.transfer_stdin = None
         self.transfer_stderr = None
 
-        _Interrupt._AllInterrupts._join()
-        allInterrupts = _Interrupt._AllInterrupts._open_list()
-        allInterrupts.append(self)
-        _Interrupt._AllInterrupts._close_list()
-
         self.in_progress = False
         self.freeze = True
+        self.expired = None # 'timed_out' or 'cancelled'
+        self._timer = None
+        self._flight = None # (cache, key) while other interrupts wait on this one's reply
+        self.created_at = time.perf_counter()
+        self.future = asyncio.Future() # resolved by scheduler when transfer answers
+        self._trace('created')
+        scheduler._new_interrupts.append(self)
+        scheduler._wake()
+
+    def _trace(self, event : str, detail : str = None):
+        tracer = self._scheduler.tracer
+        if tracer != None: tracer.emit(event, time.perf_counter(), self.proc_pid, self.proc_tag, self.interrupt_uuid, detail)
+
+    def _track(self):
+        self.in_progress = True
+        sched = self._scheduler
+        sched._interrupts_by_tag.setdefault(self.proc_tag, {})[self] = None
+        if self.no_track == True:
+            sched._interrupts_no_track.setdefault(self.proc_tag, {})[self] = None
+        else:
+            sched._interrupts_by_pid.setdefault((self.proc_tag, self.proc_pid), {})[self] = None
+            sched._interrupts_by_uuid.setdefault((self.proc_tag, self.interrupt_uuid), {})[self] = None
+
+    def _untrack(self):
+        if self.in_progress == False: return
+        self.in_progress = False
+        sched = self._scheduler
+        sched._interrupts_by_tag[self.proc_tag].pop(self, None)
+        if self.no_track == True:
+            sched._interrupts_no_track[self.proc_tag].pop(self, None)
+            return
+        same_pid = sched._interrupts_by_pid[(self.proc_tag, self.proc_pid)]
+        same_pid.pop(self, None)
+        if len(same_pid) == 0: del sched._interrupts_by_pid[(self.proc_tag, self.proc_pid)]
+        same_uuid = sched._interrupts_by_uuid[(self.proc_tag, self.interrupt_uuid)]
+        same_uuid.pop(self, None)
+        if len(same_uuid) == 0: del sched._interrupts_by_uuid[(self.proc_tag, self.interrupt_uuid)]
+
+    def _release(self, outcome : str = 'answered'):
+        self._untrack()
+        self.freeze = False
+        if self._timer != None: self._timer.cancel()
+        if self.future.done() == True: return
+        metrics = self._scheduler._metrics
+        metrics.interrupts[outcome] += 1
+        if self._flight != None: self._settle(outcome)
+        metrics.interrupt_wait_seconds.observe(time.perf_counter() - self.created_at)
+        self.future.set_result(None)
+
+    def _try_release(self):
+        if self.transfer_stderr == None: return
+        if self.expects_input == False or self.transfer_stdin != None: self._release()
+
+    def _reject(self): # target transfer is congested and fails fast
+        self.freeze = False
+        if self._timer != None: self._timer.cancel()
+        if self.future.done() == True: return
+        self._scheduler._metrics.interrupts['rejected'] += 1
+        self.future.set_exception(Exception("Transfer queue is full!"))
+        if self._flight != None: self._settle('rejected')
+
+    def _expire(self, reason : str): # timed out or the caller was cancelled, queued work is dropped before the holder sees it
+        if self.freeze == False: return
+        self.freeze = False
+        self.expired = reason
+        if self._timer != None: self._timer.cancel()
+        if self.proc_stdout.taken == False:
+            tr = self._scheduler._transfers._unsafe_list.get(self.proc_tag) if self.in_progress == True else None
+            if tr != None: tr._withdraw(self.proc_stdout)
+            self.proc_stdout.dropped = True
+            self._untrack()
+        # already with the holder, stays tracked so its late reply retires it instead of reaching the process's next interrupt
+        self._scheduler._metrics.interrupts[reason] += 1
+        self._trace('expired', reason)
+        if self.future.done() == False: self.future.set_exception(asyncio.TimeoutError())
+        if self._flight != None: self._settle(reason)
+
+    def _settle(self, outcome : str): # interrupts coalesced into this one share its outcome
+        cache, key = self._flight
+        self._flight = None
+        followers = cache.settle(key, self if outcome == 'answered' else None)
+        for follower in followers:
+            if outcome == 'answered':
+                follower.transfer_stdin = _StdinCall(self.transfer_stdin.data, follower.proc_pid, follower.interrupt_uuid, follower.proc_tag)
+                follower.transfer_stderr = _StderrCall(self.transfer_stderr.data, follower.proc_pid, follower.interrupt_uuid, follower.proc_tag)
+                follower._release()
+            elif outcome == 'rejected':
+                follower._reject()
+            elif outcome == 'abandoned':
+                follower._abandon()
+            else: # this one expired, the followers go round again and the first still waiting leads
+                self._scheduler._new_interrupts.append(follower)
+                self._scheduler._wake()
+
+    def _abandon(self): # target transfer is gone
+        if self.transfer_stderr == None: self.transfer_stderr = _StderrCall(None, None, None, None)
+        if self.transfer_stdin == None: self.transfer_stdin = _StdinCall(None, None, None, None)
+        self._release('abandoned')
+
+
+class _TransferGroup:
+    # transfers serving one logical resource, processes interrupt the group tag and each interrupt goes to one member
+    __slots__ = ['tag', 'members', 'policy', 'cooldown', 'dispatched', 'failovers', '_next']
+    policies = ('least_outstanding', 'least_loaded')
+
+    def __init__(self, tag : str, members : list, policy : str, cooldown : float):
+        self.tag = tag
+        self.members = members
+        self.policy = policy # least_outstanding counts interrupts the member hasn't answered, least_loaded only its queue
+        self.cooldown = cooldown # seconds a member is skipped after is_fatal fires, unless every member is failing
+        self.dispatched = dict.fromkeys(members, 0)
+        self.failovers = 0
+        self._next = 0 # rotates the starting member so ties spread
+
+
+class _Worker:
+    # long-lived coroutine running one iteration function of one entity whenever the tick hands it work, only for worker mode
+    __slots__ = ['entity', 'call', 'parked']
+
+    def __init__(self, entity, call):
+        self.entity = entity
+        self.call = call
+        self.parked = None # resolved with True to run again, False to exit
+
+
+class Scheduler:
+    modes = ('polling', 'wakeup', 'worker') # worker is wakeup with iterations run by parked coroutines instead of a task each
+
+    def __init__(self, mode : str = 'polling', idle_timeout : float = None, executor = None, classes : dict = None, dispatch_limit : int = None,
+                 metrics_file : str = None, metrics_interval : float = 10.0, tracer = None):
+        self.mode = mode
+        self.idle_timeout = idle_timeout
+        self.executor = executor # default for offloaded hooks, None is the loop's default executor
+        self.metrics_file = metrics_file # Prometheus text dump, rewritten every metrics_interval seconds while running
+        self.metrics_interval = metrics_interval
+        self.tracer = tracer # sink with emit(event, timestamp, pid, tag, track_uuid, detail) and flush(), see ioscheduler.tracing
+        self._metrics = _Metrics()
+        self.classes = {'default': 1} # priority class -> weight
+        self.dispatch_limit = None # body iterations started per tick, None starts every ready process
+        self._fair = False
+        self._class_stats = {}
+        self._dispatch_queue = None # processes waiting for a body iteration, only with classes or a dispatch limit
+        self._dispatch_queued = {} # ordered set of the processes in it
+
+        self._transfers = _SemaphoredList({}) # tag -> transfer
+        self._processes = _SemaphoredList({}) # pid -> process
+        self._transfers_alive = 0
+        self._processes_alive = 0
+        self._next_pid = 1
+        self._free_pids = collections.deque() # pids of reaped processes, reused oldest first
+
+        self._new_interrupts = collections.deque() # not handed to a transfer yet
+        self._interrupts_by_tag = {} # tag -> in-flight interrupts
+        self._interrupts_by_pid = {} # (tag, pid) -> tracked interrupts in arrival order (pids wrap)
+        self._interrupts_by_uuid = {} # (tag, uuid) -> tracked interrupts in arrival order (track_uuid may repeat)
+        self._interrupts_no_track = {} # tag -> no_track interrupts in arrival order
+        self._forwarders = {} # tag -> forwarder for transfers owned by another scheduler
+        self._groups = {} # group tag -> group
+        self._member_of = {} # transfer tag -> group
+        self._failed_members = [] # group members is_fatal fired on since the last tick
+
+        self._running = False
+        self._setup_loop = None # loop for processes created outside a running loop, start() runs on it
+        self._thread_loop = False # start() runs on the thread's default loop and leaves it open, only for the module-level scheduler
+        self._wakeup = None
+        self._ready_transfers = {} # ordered set, only for wakeup
+        self._ready_processes = {} # ordered set, only for wakeup
+        self._dead_transfers = []
+        self._dead_processes = []
+        self._idle_workers = {} # entity -> iteration function -> parked workers, only for worker mode
+        self.set_classes(classes, dispatch_limit)
+
+    def set_classes(self, classes : dict = None, dispatch_limit : int = None):
+        if len(self._transfers._unsafe_list) > 0 or len(self._processes._unsafe_list) > 0:
+            raise Exception("Set priority classes before creating transfers and processes!")
+        weights = {'default': 1}
+        if classes != None: weights.update(classes)
+        for weight in weights.values():
+            if weight <= 0: raise Exception("Priority class weight must be positive!") # every class keeps a share
+        if dispatch_limit != None and dispatch_limit < 1: raise Exception("Dispatch limit must be at least 1!")
+        self.classes = weights
+        self.dispatch_limit = dispatch_limit
+        self._fair = len(weights) > 1 or dispatch_limit != None
+        self._class_stats = {name: {'weight': weight, 'items': 0, 'wait_total': 0.0, 'wait_max': 0.0, 'iterations': 0, 'deferred': 0}
+                             for name, weight in weights.items()}
+        self._dispatch_queue = _FairQueue(weights)
+        self._dispatch_queued = {}
+
+    def class_metrics(self): # per priority class: transfer queue items served and their wait, body iterations started and deferred
+        return {name: dict(stats) for name, stats in self._class_stats.items()}
+
+    def metrics(self): # snapshot of scheduler, transfer and process metrics
+        metrics = self._metrics
+        iteration_seconds = {}
+        for (holder, call), histogram in metrics.iteration_seconds.items(): # holders with the same class name in different places stay apart
+            iteration_seconds.setdefault('%s.%s' % (holder.__module__, holder.__qualname__), {})[call.__name__.strip('_').replace('_iteration_call', '')] = histogram.snapshot()
+        transfers = {}
+        for tag, tr in self._transfers._unsafe_list.items():
+            transfers[tag] = {'stdout': len(tr._stdout), 'stdreq': len(tr._stdreq), 'stdin': len(tr._stdin), 'stderr': len(tr._stderr), 'waiting': len(tr._waiting)}
+        return {
+            'transfers_alive': self._transfers_alive,
+            'processes_alive': self._processes_alive,
+            'ticks': metrics.ticks,
+            'tasks_spawned': metrics.tasks_spawned,
+            'tick_seconds': metrics.tick_seconds.snapshot(),
+            'tasks_per_tick': metrics.tasks_per_tick.snapshot(),
+            'interrupt_wait_seconds': metrics.interrupt_wait_seconds.snapshot(),
+            'interrupts': dict(metrics.interrupts),
+            'iteration_seconds': iteration_seconds,
+            'transfers': transfers,
+            'classes': self.class_metrics(),
+            'groups': {tag: {'dispatched': dict(group.dispatched), 'failovers': group.failovers} for tag, group in self._groups.items()},
+            'caches': {tag: tr._cache.snapshot() for tag, tr in self._transfers._unsafe_list.items() if tr._cache != None},
+        }
+
+    def dump_metrics(self, path : str): # written next to path first so readers never see half a file
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(to_prometheus(self.metrics()))
+        os.replace(temp_path, path)
+
+    async def _dump_metrics_periodically(self):
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            self.dump_metrics(self.metrics_file)
+
+    def _new_queue(self):
+        if self._fair == True: return _FairQueue(self.classes, self._class_stats)
+        return collections.deque()
+
+    def create_transfer(self, holder : Union['FreeTransferHolder', 'BlockingTransferHolder'], locals : object, tag : str):
+        self._transfers._join()
+        allTransfers = self._transfers._open_list()
+        if tag in allTransfers or tag in self._groups:
+            self._transfers._close_list()
+            raise Exception("Can't create second transfer with the same tag!")
+        allTransfers[tag] = Transfer(holder, locals, tag, self)
+        self._transfers._close_list()
+
+    def create_group(self, tag : str, members : list, policy : str = 'least_outstanding', cooldown : float = 1.0):
+        if tag in self._groups or tag in self._transfers._unsafe_list: raise Exception("Can't create second transfer with the same tag!")
+        if len(members) == 0: raise Exception("Transfer group needs members!")
+        if policy not in _TransferGroup.policies: raise Exception("Unknown group policy!")
+        for member in members:
+            if member in self._member_of: raise Exception("Transfer is already in a group!")
+        group = _TransferGroup(tag, list(members), policy, cooldown)
+        self._groups[tag] = group
+        for member in members: self._member_of[member] = group
+
+    # call from inside the loop that awaits run(), the returned future belongs to it;
+    # processes created outside any loop are only for start(), which runs them on a loop of its own (the thread's default loop for the module-level scheduler)
+    def create_process(self, holder : 'ProcessHolder', locals : object, tag : str, priority : str = 'default'):
+        self_process = Process(holder, locals, tag, self, priority)
+        self._processes._join()
+        allProcesses = self._processes._open_list()
+        allProcesses[self_process.pid] = self_process
+        self._processes._close_list()
+        return self_process.my_future
 
+    def start(self): # from outside any loop, runs on the loop processes created so far are bound to
+        eloop = self._setup_loop if self._setup_loop != None else self._new_setup_loop()
+        try:
+            eloop.run_until_complete(self.run())
+        finally:
+            self._setup_loop = None
+            if self._thread_loop == False: eloop.close()
+
+    def _loop(self): # create_process inside a running loop binds to it, outside binds to the loop start() will run
+        try:
+            return asyncio.get_running_loop()
+        except RuntimeError:
+            if self._setup_loop == None: self._setup_loop = self._new_setup_loop()
+            return self._setup_loop
+
+    def _new_setup_loop(self): # tasks callers scheduled on the default loop run alongside the module-level scheduler
+        if self._thread_loop == True: return asyncio.get_event_loop()
+        return asyncio.new_event_loop()
+
+    def is_running(self):
+        return self._running
+
+    def processes_alive(self): # processes not stopped yet, for stop conditions
+        return self._processes_alive
+
+    def transfers_alive(self): # transfers not stopped yet, for stop conditions
+        return self._transfers_alive
+
+    def _allocate_pid(self): # unique among live processes and in-flight remote requests
+        if len(self._free_pids) > 0: return self._free_pids.popleft()
+        pid = self._next_pid
+        self._next_pid += 1
+        return pid
+
+    def _release_pid(self, pid : int):
+        self._free_pids.append(pid)
+
+    def get_process(self, pid : int): # live process by pid, None if there is none
+        return self._processes._unsafe_list.get(pid)
+
+    def _wake(self):
+        if self._wakeup != None: self._wakeup.set()
+
+    async def _iteration(self, entity, iteration_call):
+        started = time.perf_counter()
+        progress = await iteration_call()
+        key = (entity._holder, iteration_call.__func__)
+        histogram = self._metrics.iteration_seconds.get(key)
+        if histogram == None: histogram = self._metrics.iteration_seconds[key] = _Histogram(_SECONDS_BUCKETS)
+        histogram.observe(time.perf_counter() - started)
+        if progress == True:
+            entity.wake()
+        elif (entity in self._ready_transfers or entity in self._ready_processes) and entity._busy() == False: # marked while busy, the last call out re-checks
+            entity.wake()
+
+    def _start(self, entity, iteration_call):
+        if self.mode != 'worker':
+            asyncio.ensure_future(self._iteration(entity, iteration_call))
+            return
+        idle = self._idle_workers.get(entity)
+        if idle != None:
+            workers = idle.get(iteration_call.__func__)
+            if workers:
+                workers.pop().parked.set_result(True)
+                return
+        asyncio.ensure_future(self._work(_Worker(entity, iteration_call)))
+
+    async def _work(self, worker : _Worker):
+        entity = worker.entity
+        func = worker.call.__func__
+        loop = asyncio.get_running_loop()
+        running = True
+        while running == True:
+            await self._iteration(entity, worker.call)
+            if entity.is_alive() == False: break
+            worker.parked = loop.create_future()
+            self._idle_workers.setdefault(entity, {}).setdefault(func, []).append(worker)
+            running = await worker.parked
+
+    def _retire_workers(self, entity):
+        for workers in self._idle_workers.pop(entity, {}).values():
+            for worker in workers: worker.parked.set_result(False)
+
+    def _carry(self, ready : dict, entity): # busy entity stays marked, its running iteration wakes it when done
+        if self.mode != 'polling': ready[entity] = None
+
+    def _free_slots(self, tr : Transfer, in_flight : int, queued : int): # iterations to start for one side of a free transfer
+        if in_flight == 0 and (tr._in_init_state == True or queued == 0): return 1 # on_start and stop_condition run once
+        if tr._in_init_state == True: return 0
+        return max(0, min(tr._concurrency - in_flight, queued))
+
+    def _dispatch_fair(self, ready_processes : dict, start_list : list):
+        queue = self._dispatch_queue # kept across ticks, the stride state is what shares out the limit
+        for proc in ready_processes:
+            if proc.is_alive() == False or proc in self._dispatch_queued: continue
+            if proc.is_iteration() == True:
+                self._carry(self._ready_processes, proc)
+                continue
+            queue.append(proc)
+            self._dispatch_queued[proc] = None
+        limit = self.dispatch_limit
+        started = 0
+        while len(queue) > 0 and (limit == None or started < limit):
+            proc = queue.popleft()
+            del self._dispatch_queued[proc]
+            if proc.is_alive() == False: continue
+            self._class_stats[proc.priority]['iterations'] += 1
+            start_list.append((proc, proc._body_iteration_call))
+            started += 1
+        if len(queue) == 0: return
+        for priority, waiting in queue._queues.items(): # over the limit, these go first on the next tick
+            self._class_stats[priority]['deferred'] += len(waiting)
+        self._wake()
+
+    async def _park(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            for tr in self._transfers._unsafe_list.values(): self._ready_transfers[tr] = None
+            for proc in self._processes._unsafe_list.values(): self._ready_processes[proc] = None
+
+    def _find_interrupt(self, call, field : str):
+        if call.proc_pid != None:
+            same_key = self._interrupts_by_pid.get((call.tag, call.proc_pid), ())
+        else:
+            same_key = self._interrupts_by_uuid.get((call.tag, call.call_uuid), ())
+        for inter in same_key:
+            if getattr(inter, field) == None: return inter
+        for inter in self._interrupts_no_track.get(call.tag, ()):
+            if getattr(inter, field) == None: return inter
+        return None
 
-class _Core:
-    init = False
-
-    @staticmethod
-    def _start():
-        if _Core.init == True: raise Exception("Already running!")
-        _Core.init = True
-        eloop = asyncio.get_event_loop()
-        eloop.run_until_complete(_Core._scheduler())
-
-    @staticmethod
-    async def _scheduler():
+    def _pick_member(self, group : _TransferGroup, allTransfers : dict):
+        candidates = []
+        for member in group.members:
+            tr = allTransfers.get(member)
+            if tr != None and tr.is_alive() == True and tr._in_stop_state == False: candidates.append(tr)
+        if len(candidates) == 0: return None
+        now = time.monotonic()
+        healthy = [tr for tr in candidates if tr._fatal_at == None or now - tr._fatal_at >= group.cooldown]
+        if len(healthy) > 0: candidates = healthy
+        start = group._next % len(candidates)
+        group._next += 1
+        best, best_load = None, None
+        for i in range(0, len(candidates)):
+            tr = candidates[(start + i) % len(candidates)]
+            if group.policy == 'least_outstanding':
+                load = (tr._congested, len(self._interrupts_by_tag.get(tr.tag, ())) + len(tr._waiting))
+            else:
+                load = (tr._congested, tr.depth() + len(tr._waiting))
+            if best_load == None or load < best_load: best, best_load = tr, load
+        return best
+
+    def _assign(self, group : _TransferGroup, inter : _Interrupt, allTransfers : dict): # retags the interrupt with its member, replies route by member tag
+        tr = self._pick_member(group, allTransfers)
+        if tr == None: return
+        inter.proc_tag = tr.tag
+        inter.proc_stdout.tag = tr.tag
+        group.dispatched[tr.tag] += 1
+
+    def _failover(self, tr : Transfer): # interrupts the member's holder hasn't taken go back through the group
+        group = self._member_of[tr.tag]
+        moved = [inter for inter in self._interrupts_by_tag.get(tr.tag, ()) if inter.proc_stdout.taken == False]
+        moved.extend(tr._waiting)
+        tr._waiting.clear()
+        for inter in moved:
+            inter._untrack()
+            call = inter.proc_stdout
+            tr._withdraw(call)
+            inter.proc_stdout = _StdoutCall(call.data, call.proc_pid, call.call_uuid, group.tag, call.priority)
+            inter.proc_tag = group.tag
+            inter._trace('failover', tr.tag)
+            self._new_interrupts.append(inter)
+        group.failovers += len(moved)
+
+    def _admit(self, tr : Transfer, inter : _Interrupt):
+        if inter.proc_stdout.data != None and (tr._blocking == False or inter.expects_input == False):
+            tr._stdout.append(inter.proc_stdout)
+        if inter.expects_input == True:
+            tr._stdreq.append(inter.proc_stdout)
+        inter._track()
+        inter._trace('enqueued')
+        if tr._capacity != None and tr.depth() >= tr._capacity: tr._congested = True
+
+    def _admit_waiting(self, tr : Transfer):
+        if tr._congested == True and tr.depth() <= tr._low_watermark: tr._congested = False
+        while len(tr._waiting) > 0 and tr._congested == False:
+            inter = tr._waiting.popleft()
+            if inter.expired == None: self._admit(tr, inter)
+
+    def depth(self, tag : str): # items queued for the transfer or across the group's members, 0 if there is none
+        if tag in self._groups: return sum(self.depth(member) for member in self._groups[tag].members)
+        tr = self._transfers._unsafe_list.get(tag)
+        if tr == None: return 0
+        return tr.depth()
+
+    def _route_replies(self, tr : Transfer):
+        while len(tr._stdin) > 0:
+            call = tr._stdin.popleft()
+            inter = self._find_interrupt(call, 'transfer_stdin')
+            if inter == None: continue
+            inter.transfer_stdin = call
+            inter._trace('routed', 'stdin')
+            inter._try_release()
+        while len(tr._stderr) > 0:
+            call = tr._stderr.popleft()
+            inter = self._find_interrupt(call, 'transfer_stderr')
+            if inter == None: continue
+            inter.transfer_stderr = call
+            inter._trace('routed', 'stderr')
+            inter._try_release()
+
+    async def run(self):
+        if self._running == True: raise Exception("Already running!")
+        if self.mode not in Scheduler.modes: raise Exception("Unknown scheduler mode!")
+        if self._setup_loop != None and self._setup_loop is not asyncio.get_running_loop():
+            raise Exception("Processes were created outside the running loop, create them inside it or use start()!")
+        self._running = True
+        self._wakeup = asyncio.Event()
+        dumper = None
+        if self.metrics_file != None: dumper = asyncio.ensure_future(self._dump_metrics_periodically())
+        try:
+            await self._scheduler()
+        finally:
+            if len(self._idle_workers) > 0:
+                for entity in list(self._idle_workers): self._retire_workers(entity)
+                await asyncio.sleep(0) # parked workers exit before the loop can close
+            if dumper != None:
+                dumper.cancel()
+                self.dump_metrics(self.metrics_file)
+            if self.tracer != None: self.tracer.flush()
+            self._wakeup = None
+            self._running = False
+
+    async def _scheduler(self):
         while True:
-            if Transfer._AliveCount <= 0 and Process._AliveCount <= 0: break
-            _Interrupt._AllInterrupts._join()
-            Transfer._AllTransfers._join()
-            Process._AllProcesses._join()
-            allInterrupts = _Interrupt._AllInterrupts._open_list()
-            allTransfers = Transfer._AllTransfers._open_list()
-            allProcesses = Process._AllProcesses._open_list()
-
-            pop_tr_list = []
-            pop_inter_list = []
-            pop_proc_list = []
+            if self._transfers_alive <= 0 and self._processes_alive <= 0: break
+            tick_started = time.perf_counter()
+            self._wakeup.clear()
+            self._transfers._join()
+            self._processes._join()
+            allTransfers = self._transfers._open_list()
+            allProcesses = self._processes._open_list()
+
+            dead_transfers, dead_processes = self._dead_transfers, self._dead_processes
+            self._dead_transfers, self._dead_processes = [], []
+            for tr in dead_transfers:
+                if allTransfers.get(tr.tag) is tr: del allTransfers[tr.tag]
+                self._retire_workers(tr)
+            for proc in dead_processes:
+                self._retire_workers(proc)
+                if allProcesses.get(proc.pid) is proc:
+                    del allProcesses[proc.pid]
+                    self._release_pid(proc.pid)
+
+            if self.mode == 'polling' or len(dead_transfers) > 0 or len(dead_processes) > 0:
+                ready_transfers = dict.fromkeys(allTransfers.values()) # lifecycle changes may satisfy stop conditions
+            else:
+                ready_transfers = self._ready_transfers
+            ready_processes = allProcesses.values() if self.mode == 'polling' else self._ready_processes
+            self._ready_transfers, self._ready_processes = {}, {}
+
+            for tr in ready_transfers:
+                self._route_replies(tr)
+                if tr.is_alive() == True: self._admit_waiting(tr)
+            failed_members, self._failed_members = self._failed_members, []
+            for tr in failed_members:
+                self._failover(tr)
+            for tr in dead_transfers:
+                self._route_replies(tr)
+                if tr.tag in self._member_of: self._failover(tr)
+                for inter in list(self._interrupts_by_tag.get(tr.tag, ())):
+                    inter._abandon()
+                while len(tr._waiting) > 0:
+                    tr._waiting.popleft()._abandon()
+
+            newInterrupts = self._new_interrupts
+            while len(newInterrupts) > 0:
+                inter = newInterrupts.popleft()
+                if inter.expired != None: continue
+                if inter.proc_tag in self._groups: self._assign(self._groups[inter.proc_tag], inter, allTransfers)
+                tr = allTransfers.get(inter.proc_tag)
+                if tr == None and inter.proc_tag in self._forwarders:
+                    self._forwarders[inter.proc_tag].submit(inter)
+                    continue
+                if tr == None or tr.is_alive() == False:
+                    inter._abandon()
+                    continue
+                if tr._cache != None and inter.expects_input == True and tr._cache.lookup(inter) == True: continue
+                if tr._congested == True or len(tr._waiting) > 0:
+                    if tr._holder.overflow == 'fail':
+                        inter._reject()
+                    else:
+                        tr._waiting.append(inter)
+                    continue
+                self._admit(tr, inter)
+                ready_transfers[tr] = None
 
             start_list = []
 
-            for i in range(0, len(allTransfers)):
-                if allTransfers[i]._holder.__bases__[0] == FreeTransferHolder:
-                    if allTransfers[i].is_alive() == True and allTransfers[i].is_stdout() == False:
-                        start_list.append(allTransfers[i]._stdout_iteration_call)
-                    if allTransfers[i].is_alive() == True and allTransfers[i].is_stdin() == False:
-                        start_list.append(allTransfers[i]._stdin_iteration_call)
+            for tr in ready_transfers:
+                if tr.is_alive() == False: continue
+                if tr._blocking == False:
+                    if tr.is_stdout() == True or tr.is_stdin() == True: self._carry(self._ready_transfers, tr)
+                    for _ in range(self._free_slots(tr, tr._stdout_in_flight, len(tr._stdout))):
+                        start_list.append((tr, tr._stdout_iteration_call))
+                    for _ in range(0, min(tr._concurrency - tr._stdin_in_flight, len(tr._stdreq))): # stdin has nothing to do without requests
+                        start_list.append((tr, tr._stdin_iteration_call))
+                elif tr.is_stdinout() == False:
+                    start_list.append((tr, tr._stdinout_iteration_call))
                 else:
-                    if allTransfers[i].is_alive() == True and allTransfers[i].is_stdinout() == False:
-                        start_list.append(allTransfers[i]._stdinout_iteration_call)
-
-                if allTransfers[i].is_alive() == False: pop_tr_list.append(i)
-
-            for i in range(0, len(allProcesses)):
-                if allProcesses[i].is_alive() == True and allProcesses[i].is_iteration() == False:
-                    start_list.append(allProcesses[i]._body_iteration_call)
-                if allProcesses[i].is_alive() == False: pop_proc_list.append(i)
-
-            all_inputs = []
-            all_errors = []
-            all_tr_tags = []
-
-            for tr in allTransfers:
-                while tr._stdin.empty() != True:
-                    all_inputs.append(tr._stdin.get())
-                while tr._stderr.empty() != True:
-                    all_errors.append(tr._stderr.get())
-                all_tr_tags.append(tr.tag)
-                for inter in allInterrupts:
-                    if inter.freeze == False: continue
-                    if inter.proc_tag != tr.tag: continue
-                    if inter.in_progress == True: continue
-                    if inter.proc_stdout.data != None and tr._holder.__bases__[0] != BlockingTransferHolder:
-                        tr._stdout.put(inter.proc_stdout)
-                    if inter.expects_input == True:
-                        tr._stdreq.put(inter.proc_stdout)
-                    inter.in_progress = True
-            no_track_inters = []
-
-            for i in range(0, len(allInterrupts)):
-                if allInterrupts[i].freeze == False:
-                    pop_inter_list.append(i)
-                    continue
-                if allInterrupts[i].no_track == True:
-                    no_track_inters.append(allInterrupts[i])
-                    continue
-                for j in range(0, len(all_inputs)):
-                    if all_inputs[j] == None: continue
-                    if allInterrupts[i].proc_tag != all_inputs[j].tag: continue
-                    if all_inputs[j].proc_pid == allInterrupts[i].proc_pid or all_inputs[j].call_uuid == allInterrupts[i].interrupt_uuid:
-                        allInterrupts[i].transfer_stdin = all_inputs[j]
-                        all_inputs[j] = None
-                        break
-                for j in range(0, len(all_errors)):
-                    if all_errors[j] == None: continue
-                    if allInterrupts[i].proc_tag != all_errors[j].tag: continue
-                    if all_errors[j].proc_pid == allInterrupts[i].proc_pid or all_errors[j].call_uuid == allInterrupts[i].interrupt_uuid:
-                        allInterrupts[i].transfer_stderr = all_errors[j]
-                        all_errors[j] = None
-                        break
-                if allInterrupts[i].transfer_stderr != None:
-                    if allInterrupts[i].expects_input == False:
-                        allInterrupts[i].freeze = False
-                    elif allInterrupts[i].transfer_stdin != None:
-                        allInterrupts[i].freeze = False
-                if allInterrupts[i].proc_tag not in all_tr_tags:
-                    if allInterrupts[i].transfer_stderr == None: allInterrupts[i].transfer_stderr = _StderrCall(None, None, None,None)
-                    if allInterrupts[i].transfer_stdin == None: allInterrupts[i].transfer_stdin = _StdinCall(None, None, None,None)
-                    allInterrupts[i].freeze = False
-                    continue
+                    self._carry(self._ready_transfers, tr)
 
-            for nt in no_track_inters:
-                for inp in all_inputs:
-                    if inp != None and inp.tag == nt.proc_tag:
-                        nt.transfer_stdin = inp
-                        break
-                for err in all_errors:
-                    if err != None and err.tag == nt.proc_tag:
-                        nt.transfer_stderr = err
-                        break
-                if nt.transfer_stdin != None and nt.transfer_stderr != None:
-                    nt.freeze = False
+            if self._fair == True:
+                self._dispatch_fair(ready_processes, start_list)
+            else:
+                for proc in ready_processes:
+                    if proc.is_alive() == False: continue
+                    if proc.is_iteration() == False:
+                        start_list.append((proc, proc._body_iteration_call))
+                    else:
+                        self._carry(self._ready_processes, proc)
+
+            self._transfers._close_list()
+            self._processes._close_list()
+            for entity, task in start_list:
+                self._start(entity, task)
+            self._metrics.ticks += 1
+            self._metrics.tasks_spawned += len(start_list)
+            self._metrics.tasks_per_tick.observe(len(start_list))
+            self._metrics.tick_seconds.observe(time.perf_counter() - tick_started)
+
+            if self.mode == 'polling' or self._wakeup.is_set() == True:
+                await asyncio.sleep(0)
+            else:
+                await self._park()
 
-            for i in range(0, len(pop_tr_list)):
-                allTransfers.pop(pop_tr_list[i] - i)
-            for i in range(0, len(pop_proc_list)):
-                allProcesses.pop(pop_proc_list[i] - i)
-            for i in range(0, len(pop_inter_list)):
-                allInterrupts.pop(pop_inter_list[i] - i)
 
-            _Interrupt._AllInterrupts._close_list()
-            Transfer._AllTransfers._close_list()
-            Process._AllProcesses._close_list()
-            for task in start_list:
-                asyncio.ensure_future(task())
+_default_scheduler = Scheduler()
+_default_scheduler._thread_loop = True
 
-            await asyncio.sleep(0)
+def start(mode : str = 'polling', idle_timeout : float = None):
+    _default_scheduler.mode = mode
+    _default_scheduler.idle_timeout = idle_timeout
+    _default_scheduler.start()
 
-        _Core.init = False
+def create_process(holder : ProcessHolder, locals : object, tag : str, priority : str = 'default'):
+    return _default_scheduler.create_process(holder, locals, tag, priority)
 
-def start():
-    _Core._start()
+def metrics():
+    return _default_scheduler.metrics()
 
-def create_process(holder : ProcessHolder, locals : object, tag : str):
-    return Process.create_process(holder, locals, tag)
+def processes_alive():
+    return _default_scheduler.processes_alive()
+
+def transfers_alive():
+    return _default_scheduler.transfers_alive()
+
+def set_tracer(tracer):
+    _default_scheduler.tracer = tracer
+
+def set_classes(classes : dict = None, dispatch_limit : int = None):
+    _default_scheduler.set_classes(classes, dispatch_limit)
 
 def create_transfer(holder : Union[FreeTransferHolder, BlockingTransferHolder], locals : object, tag : str):
-    Transfer.create_transfer(holder, locals, tag)
+    _default_scheduler.create_transfer(holder, locals, tag)
+
+def create_group(tag : str, members : list, policy : str = 'least_outstanding', cooldown : float = 1.0):
+    _default_scheduler.create_group(tag, members, policy, cooldown)
+
+def depth(tag : str):
+    return _default_scheduler.depth(tag)
@@ -0,0 +1,260 @@
+import asyncio
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import pickle
+import socket
+import struct
+from typing import Union
+
+from .ioscheduler import Scheduler
+from .ioscheduler import FreeTransferHolder
+from .ioscheduler import BlockingTransferHolder
+from .ioscheduler import ProcessHolder
+from .ioscheduler import _Interrupt
+from .ioscheduler import _StdinCall
+from .ioscheduler import _StderrCall
+
+_HEADER = struct.Struct('!II') # pickle size, out-of-band buffer count
+_BUFFER = struct.Struct('!Q?') # size, whether it was a bytearray (rebuilt as one) rather than a memoryview
+
+_REQUEST = 0 # (kind, seq, uuid, tag, no_track, expects_input, data), seq is the sender's forwarder's, track_uuid may repeat
+_REPLY = 1 # (kind, seq, stdin_data, stderr_data)
+_PROCESS_STOPPED = 2 # (kind,)
+_REJECTED = 3 # (kind, seq)
+
+
+def _out_of_band(field): # bytearray and memoryview payloads are written as they are without a copy into the pickle
+    if type(field) is bytearray or type(field) is memoryview: return pickle.PickleBuffer(field)
+    return field # anything else keeps its type through the pickle
+
+
+class _Link:
+    # framed pickle stream to one peer shard
+    __slots__ = ['_sock', '_reader', '_writer']
+
+    def __init__(self, sock : socket.socket):
+        self._sock = sock
+        self._reader = None
+        self._writer = None
+
+    async def open(self):
+        self._reader, self._writer = await asyncio.open_connection(sock=self._sock)
+
+    def send(self, message : tuple):
+        if self._writer.is_closing() == True: return
+        buffers = []
+        kinds = [type(field) is bytearray for field in message if type(field) is bytearray or type(field) is memoryview] # in pickling order
+        message = tuple(_out_of_band(field) for field in message)
+        payload = pickle.dumps(message, 5, buffer_callback=buffers.append)
+        raws = [buffer.raw() for buffer in buffers]
+        header = _HEADER.pack(len(payload), len(raws)) + b''.join(_BUFFER.pack(raw.nbytes, kind) for raw, kind in zip(raws, kinds))
+        self._writer.writelines([header, payload] + raws)
+
+    async def recv(self):
+        size, count = _HEADER.unpack(await self._reader.readexactly(_HEADER.size))
+        layout = [_BUFFER.unpack(await self._reader.readexactly(_BUFFER.size)) for _ in range(0, count)]
+        payload = await self._reader.readexactly(size)
+        buffers = []
+        for buffer_size, was_bytearray in layout: # a holder gets the type a local one would, bytearray stays mutable
+            data = await self._reader.readexactly(buffer_size)
+            buffers.append(bytearray(data) if was_bytearray == True else memoryview(data))
+        return pickle.loads(payload, buffers=buffers)
+
+    async def close(self):
+        self._writer.close()
+        try:
+            await self._writer.wait_closed() # flush what is still buffered for the peer
+        except ConnectionError:
+            pass
+
+
+class _Forwarder:
+    # sends interrupts for transfers owned by a peer shard and resolves them with its replies
+    __slots__ = ['_link', '_pending', '_seq']
+
+    def __init__(self, link : _Link):
+        self._link = link
+        self._pending = {} # seq -> interrupt
+        self._seq = itertools.count()
+
+    def submit(self, inter : _Interrupt):
+        seq = next(self._seq)
+        self._pending[seq] = inter
+        self._link.send((_REQUEST, seq, inter.interrupt_uuid, inter.proc_tag, inter.no_track, inter.expects_input, inter.proc_stdout.data))
+
+    def reply(self, seq : int, stdin_data, stderr_data):
+        inter = self._pending.pop(seq, None)
+        if inter == None: return
+        inter.transfer_stdin = _StdinCall(stdin_data, inter.proc_pid, inter.interrupt_uuid, inter.proc_tag)
+        inter.transfer_stderr = _StderrCall(stderr_data, inter.proc_pid, inter.interrupt_uuid, inter.proc_tag)
+        inter._release()
+
+    def reject(self, seq : int):
+        inter = self._pending.pop(seq, None)
+        if inter != None: inter._reject()
+
+    def abandon_all(self):
+        pending, self._pending = self._pending, {}
+        for inter in pending.values():
+            inter._abandon()
+
+
+class _Shard:
+    def __init__(self, index : int, scheduler : Scheduler, links : dict, alive):
+        self.index = index
+        self.scheduler = scheduler
+        self.links = links # peer index -> _Link
+        self.forwarders = {peer: _Forwarder(link) for peer, link in links.items()}
+        self.alive = alive
+
+    async def serve_request(self, link : _Link, message : tuple):
+        _, seq, uuid, tag, no_track, expects_input, data = message
+        pid = self.scheduler._allocate_pid()
+        inter = _Interrupt(self.scheduler, pid, tag, no_track, expects_input, uuid, data)
+        try:
+            await inter.future
+        except Exception: # owning transfer is congested and fails fast
+            link.send((_REJECTED, seq))
+            return
+        finally:
+            self.scheduler._release_pid(pid)
+        stdin_data = inter.transfer_stdin.data if inter.transfer_stdin != None else None
+        link.send((_REPLY, seq, stdin_data, inter.transfer_stderr.data))
+
+    async def read(self, peer : int):
+        link, forwarder = self.links[peer], self.forwarders[peer]
+        try:
+            while True:
+                message = await link.recv()
+                if message[0] == _REQUEST:
+                    asyncio.ensure_future(self.serve_request(link, message))
+                elif message[0] == _REPLY:
+                    forwarder.reply(message[1], message[2], message[3])
+                elif message[0] == _REJECTED:
+                    forwarder.reject(message[1])
+                elif message[0] == _PROCESS_STOPPED:
+                    self.wake_transfers()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            forwarder.abandon_all()
+            self.wake_transfers()
+
+    def wake_transfers(self): # stop conditions may depend on processes of other shards
+        for tr in list(self.scheduler._transfers._unsafe_list.values()):
+            tr.wake()
+
+    def on_process_stopped(self, future : asyncio.Future):
+        with self.alive.get_lock():
+            self.alive.value -= 1
+        for link in self.links.values():
+            link.send((_PROCESS_STOPPED,))
+        self.wake_transfers()
+
+
+async def _shard_main(index : int, transfers : list, processes : list, socks : dict, mode : str, idle_timeout : float, alive):
+    links = {}
+    for peer, sock in socks.items():
+        links[peer] = _Link(sock)
+        await links[peer].open()
+    shard = _Shard(index, Scheduler(mode, idle_timeout), links, alive)
+
+    for holder, locals, tag, owner in transfers:
+        if owner == index:
+            shard.scheduler.create_transfer(holder, locals, tag)
+        else:
+            shard.scheduler._forwarders[tag] = shard.forwarders[owner]
+    futures = {}
+    for handle, (holder, locals, tag, owner) in enumerate(processes):
+        if owner != index: continue
+        futures[handle] = shard.scheduler.create_process(holder, locals, tag)
+        futures[handle].add_done_callback(shard.on_process_stopped)
+
+    readers = [asyncio.ensure_future(shard.read(peer)) for peer in links]
+    try:
+        await shard.scheduler.run()
+    finally:
+        for reader in readers: reader.cancel()
+        for link in links.values(): await link.close()
+    return {handle: future.result() for handle, future in futures.items()}
+
+
+def _shard_worker(index : int, transfers : list, processes : list, socks : dict, results, mode : str, idle_timeout : float, alive):
+    for other, peer_socks in socks.items(): # forked from the parent, drop the other shards' ends so peers see EOF
+        if other == index: continue
+        for sock in peer_socks.values(): sock.close()
+    try:
+        results.send((True, asyncio.run(_shard_main(index, transfers, processes, socks[index], mode, idle_timeout, alive))))
+    except BaseException as e:
+        results.send((False, repr(e)))
+    finally:
+        results.close()
+
+
+class ShardedScheduler:
+    def __init__(self, shards : int = None, mode : str = 'wakeup', idle_timeout : float = None):
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise Exception("Sharded scheduler needs the fork start method!")
+        self.shards = shards if shards != None else os.cpu_count()
+        self.mode = mode
+        self.idle_timeout = idle_timeout
+        self._context = multiprocessing.get_context('fork')
+        self._alive = self._context.Value('q', 0)
+        self._transfers = [] # (holder, locals, tag, shard)
+        self._processes = [] # (holder, locals, tag, shard)
+        self._futures = []
+        self._tags = set()
+        self._round_robin = itertools.cycle(range(0, self.shards))
+        self._running = False
+
+    def create_transfer(self, holder : Union[FreeTransferHolder, BlockingTransferHolder], locals : object, tag : str, shard : int = None):
+        if tag in self._tags: raise Exception("Can't create second transfer with the same tag!")
+        if shard == None: shard = next(self._round_robin)
+        if shard < 0 or shard >= self.shards: raise Exception("Shard index out of range!")
+        self._tags.add(tag)
+        self._transfers.append((holder, locals, tag, shard))
+
+    def create_process(self, holder : ProcessHolder, locals : object, tag : str, shard : int = None):
+        if shard == None: shard = next(self._round_robin)
+        if shard < 0 or shard >= self.shards: raise Exception("Shard index out of range!")
+        self._processes.append((holder, locals, tag, shard))
+        self._futures.append(concurrent.futures.Future())
+        with self._alive.get_lock():
+            self._alive.value += 1
+        return self._futures[-1]
+
+    def processes_alive(self): # across all shards, usable from holders in any shard
+        return self._alive.value
+
+    def start(self):
+        if self._running == True: raise Exception("Already running!")
+        self._running = True
+        socks = {index: {} for index in range(0, self.shards)}
+        for a, b in itertools.combinations(range(0, self.shards), 2):
+            socks[a][b], socks[b][a] = socket.socketpair()
+
+        workers = []
+        for index in range(0, self.shards):
+            results_recv, results_send = self._context.Pipe(duplex=False)
+            worker = self._context.Process(target=_shard_worker, args=(index, self._transfers, self._processes, socks, results_send, self.mode, self.idle_timeout, self._alive), daemon=True)
+            worker.start()
+            results_send.close() # later workers must not inherit it, or a crashed shard never reads as EOF
+            workers.append((worker, results_recv))
+        for peer_socks in socks.values():
+            for sock in peer_socks.values(): sock.close()
+
+        try:
+            for index, (worker, results_recv) in enumerate(workers):
+                try:
+                    ok, payload = results_recv.recv()
+                except EOFError:
+                    ok, payload = False, "shard %d exited with code %s" % (index, worker.exitcode)
+                worker.join()
+                for handle, (_, _, _, owner) in enumerate(self._processes):
+                    if owner != index: continue
+                    if ok == True:
+                        self._futures[handle].set_result(payload.get(handle))
+                    else:
+                        self._futures[handle].set_exception(Exception("Shard %d failed: %s" % (index, payload)))
+        finally:
+            self._running = False
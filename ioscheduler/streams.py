@@ -0,0 +1,279 @@
+import asyncio
+import collections
+import struct
+
+from .ioscheduler import FreeTransferHolder
+from .ioscheduler import Transfer
+
+_FRAME = struct.Struct('!IH') # payload size, uuid size, then the uuid and the payload
+_MAX_FRAME = 64 * 1024 * 1024
+
+_states = {} # transfer -> _StreamState, from on_start to on_stop
+
+
+async def read_frame(reader : asyncio.StreamReader): # (uuid, payload), raises asyncio.IncompleteReadError at EOF
+    size, uuid_size = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    if size > _MAX_FRAME: raise Exception("Frame too large!")
+    uuid = (await reader.readexactly(uuid_size)).decode()
+    return uuid, await reader.readexactly(size)
+
+
+def _byte_view(payload): # flat view of a bytes-like payload that fits in a frame, None for anything else
+    try:
+        view = memoryview(payload).cast('B')
+    except TypeError:
+        return None
+    if len(view) > _MAX_FRAME: return None # the peer would drop the connection and every request pipelined on it
+    return view
+
+
+def _head(queue): # item popleft would return
+    if type(queue) is collections.deque: return queue[0]
+    return queue.peek()
+
+
+def frame(uuid : str, payload) -> list: # pieces to pass to writelines
+    uuid = uuid.encode()
+    return [_FRAME.pack(len(payload), len(uuid)), uuid, payload]
+
+
+async def serve_frames(reader : asyncio.StreamReader, writer : asyncio.StreamWriter, handler):
+    # peer side of the protocol, answers every request frame with handler(payload) under the same uuid
+    # replies go out in completion order, so a slow request doesn't hold back the ones after it
+    async def answer(uuid, payload):
+        reply = handler(payload)
+        if asyncio.iscoroutine(reply): reply = await reply
+        writer.writelines(frame(uuid, reply))
+
+    tasks = set()
+    try:
+        while True:
+            uuid, payload = await read_frame(reader)
+            task = asyncio.ensure_future(answer(uuid, payload))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+    except Exception: # EOF, reset or a malformed frame, the connection is closed either way
+        pass
+    finally:
+        if len(tasks) > 0: await asyncio.wait(tasks)
+        writer.close()
+
+
+class _StreamState:
+    # one transfer's connection, replaced on reconnect, and the replies waiting for stdin
+    __slots__ = ['transfer', 'reader', 'writer', 'process', 'pending', 'outbox', 'outbox_uuids', 'flush_scheduled', 'inbox', 'inbox_waiters',
+                 'next_request', 'supervisor', 'connected', 'connects', 'frames', 'writes']
+
+    def __init__(self, transfer : Transfer):
+        self.transfer = transfer
+        self.reader = None
+        self.writer = None
+        self.process = None # child of a pipe transfer
+        self.pending = {} # uuid -> future of the reply
+        self.outbox = [] # frame pieces written together at the end of the loop pass
+        self.outbox_uuids = [] # requests whose frames are in the outbox
+        self.flush_scheduled = False
+        self.inbox = {} # uuid -> (reply, code) of input interrupts, handed out by stdin
+        self.inbox_waiters = {} # uuid -> future of a stdin call waiting for that reply
+        self.next_request = None # request is_stdin_available saw at the head of the queue, the one stdin answers next
+        self.supervisor = None
+        self.connected = False
+        self.connects = 0
+        self.frames = 0
+        self.writes = 0
+
+    def request(self, uuid : str, payload): # raises before queueing anything if the payload isn't bytes-like or is too large
+        view = _byte_view(payload)
+        if view == None: raise Exception("Stream payload must be bytes-like and fit in a frame!")
+        future = asyncio.get_running_loop().create_future()
+        self.pending[uuid] = future
+        self.outbox.extend(frame(uuid, view))
+        self.outbox_uuids.append(uuid)
+        self.frames += 1
+        if self.flush_scheduled == False:
+            self.flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self.flush)
+        return future
+
+    def flush(self): # every frame queued since the last flush goes out in one write
+        self.flush_scheduled = False
+        if len(self.outbox) == 0 or self.connected == False: return
+        outbox, self.outbox = self.outbox, []
+        uuids, self.outbox_uuids = self.outbox_uuids, []
+        try:
+            self.writer.writelines(outbox)
+        except Exception: # the stream is unusable, these requests and every other one still owed get the disconnected code
+            for uuid in uuids:
+                future = self.pending.pop(uuid, None)
+                if future != None and future.done() == False: future.set_result(None)
+            self.writer.close() # the reader sees it and the supervisor disconnects and reconnects
+            return
+        self.writes += 1
+
+    def deliver(self, uuid : str, reply, code):
+        waiter = self.inbox_waiters.pop(uuid, None)
+        if waiter == None:
+            self.inbox[uuid] = (reply, code)
+        elif waiter.done() == False:
+            waiter.set_result((reply, code))
+
+    async def receive(self, uuid : str):
+        if uuid in self.inbox: return self.inbox.pop(uuid)
+        waiter = asyncio.get_running_loop().create_future()
+        self.inbox_waiters[uuid] = waiter
+        return await waiter
+
+    def fail_waiters(self, owed : dict = {}): # stdin calls still waiting get the disconnected code, unless their reply is owed by a stdout call
+        for uuid in list(self.inbox_waiters):
+            if uuid not in owed: self.deliver(uuid, None, self.transfer._holder.disconnected)
+
+    async def supervise(self): # connects, reads replies until the stream breaks, reconnects with backoff
+        holder = self.transfer._holder
+        delay = holder.reconnect_delay
+        while True:
+            try:
+                opened = await holder.connect(self.transfer)
+            except OSError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, holder.reconnect_delay_max)
+                continue
+            delay = holder.reconnect_delay
+            self.reader, self.writer = opened[0], opened[1]
+            self.process = opened[2] if len(opened) > 2 else None
+            self.connected = True
+            self.connects += 1
+            self.flush() # requests made while the stream was down
+            self.transfer.wake() # queued ones can go now
+            try:
+                while True:
+                    uuid, reply = await read_frame(self.reader)
+                    future = self.pending.pop(uuid, None)
+                    if future != None and future.done() == False: future.set_result(reply)
+            except Exception: # EOF, reset or a malformed frame, the connection is dropped either way
+                pass
+            finally:
+                await self.disconnect()
+            await asyncio.sleep(delay)
+
+    async def disconnect(self): # replies still owed are lost, their requests get the disconnected code
+        self.connected = False
+        self.outbox, self.outbox_uuids = [], []
+        pending, self.pending = self.pending, {}
+        for future in pending.values():
+            if future.done() == False: future.set_result(None)
+        self.fail_waiters(pending) # their stdout calls deliver the disconnected code themselves
+        if self.writer != None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        if self.process != None:
+            if self.process.returncode == None: self.process.kill()
+            await self.process.wait()
+        self.reader, self.writer, self.process = None, None, None
+
+
+def _expects_input(transfer : Transfer, request_uuid : str): # whether the interrupt also waits on stdin
+    scheduler = transfer._scheduler
+    for inter in scheduler._interrupts_by_uuid.get((transfer.tag, request_uuid), ()): # the oldest one not answered yet if track_uuid repeats
+        if inter.transfer_stderr == None: return inter.expects_input
+    for inter in scheduler._interrupts_no_track.get(transfer.tag, ()): # not indexed by uuid
+        if inter.interrupt_uuid == request_uuid: return inter.expects_input
+    return False
+
+
+class StreamTransferHolder(FreeTransferHolder):
+    # request / reply over a length-prefixed asyncio stream, subclasses say how to connect
+    # output_interrupt returns the peer's reply, input_interrupt returns (reply, None), both get disconnected if the stream broke first
+    # and invalid_payload if proc_output isn't bytes-like, is larger than a frame or is missing from an input interrupt
+    # input interrupts need proc_output, the request is what the peer answers
+    concurrency = 64 # requests pipelined on the connection
+    reconnect_delay = 0.1 # seconds before connecting again, doubled on every failed attempt
+    reconnect_delay_max = 5.0
+    disconnected = 'disconnected'
+    invalid_payload = 'invalid_payload' # code for a proc_output that can't be framed, never sent
+
+    ### rewrite functions ###
+    @staticmethod
+    async def connect(transfer : Transfer): # (reader, writer) or (reader, writer, child process)
+        raise Exception("Stream transfer has no connect function!")
+
+    @staticmethod
+    async def on_start(transfer : Transfer): # call StreamTransferHolder.on_start from an override
+        state = _states[transfer] = _StreamState(transfer)
+        state.supervisor = asyncio.ensure_future(state.supervise())
+
+    @staticmethod
+    async def on_stop(transfer : Transfer): # call StreamTransferHolder.on_stop from an override
+        state = _states.pop(transfer, None)
+        if state == None: return
+        state.supervisor.cancel()
+        await state.disconnect()
+        state.fail_waiters() # nothing is delivered to a stopped transfer
+
+    @staticmethod
+    def is_stdout_available(transfer : Transfer):
+        state = _states.get(transfer)
+        return state != None and state.connected == True
+
+    @staticmethod
+    def is_stdin_available(transfer : Transfer): # call StreamTransferHolder.is_stdin_available from an override
+        state = _states.get(transfer)
+        if state == None: return False
+        state.next_request = _head(transfer._stdreq) # popped right after this returns True, stdin needs its uuid
+        return True
+
+    @staticmethod
+    async def stdout(transfer : Transfer, data, request_uuid : str):
+        state = _states[transfer]
+        if _byte_view(data) == None:
+            reply, code = None, transfer._holder.invalid_payload
+        else:
+            reply = await state.request(request_uuid, data)
+            code = reply if reply != None else transfer._holder.disconnected
+        if _expects_input(transfer, request_uuid) == False: return code, request_uuid
+        state.deliver(request_uuid, reply, code)
+        return (None if reply != None else code), request_uuid
+
+    @staticmethod
+    async def stdin(transfer : Transfer):
+        state = _states[transfer]
+        call, state.next_request = state.next_request, None
+        if call.data == None: return None, transfer._holder.invalid_payload, call.call_uuid # never reaches stdout, nothing to send
+        reply, code = await state.receive(call.call_uuid)
+        return reply, (None if reply != None else code), call.call_uuid
+
+    @staticmethod
+    def is_fatal(transfer : Transfer, return_code):
+        return return_code == transfer._holder.disconnected
+    ### rewrite functions ###
+
+    @staticmethod
+    def stream_stats(transfer : Transfer): # connects, frames sent, writes they took, replies outstanding
+        state = _states.get(transfer)
+        if state == None: return None
+        return {'connected': state.connected, 'connects': state.connects, 'frames': state.frames, 'writes': state.writes, 'pending': len(state.pending)}
+
+
+class UnixTransferHolder(StreamTransferHolder):
+    # transfer locals: {'path': socket path}
+    @staticmethod
+    async def connect(transfer : Transfer):
+        return await asyncio.open_unix_connection(transfer.locals['path'])
+
+
+class TcpTransferHolder(StreamTransferHolder):
+    # transfer locals: {'host': host, 'port': port}
+    @staticmethod
+    async def connect(transfer : Transfer):
+        return await asyncio.open_connection(transfer.locals['host'], transfer.locals['port'])
+
+
+class PipeTransferHolder(StreamTransferHolder):
+    # transfer locals: {'argv': [program, args...]}, frames go to the child's stdin and come back on its stdout
+    # the child is killed when the transfer stops and started again on reconnect
+    @staticmethod
+    async def connect(transfer : Transfer):
+        process = await asyncio.create_subprocess_exec(*transfer.locals['argv'], stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        return process.stdout, process.stdin, process
@@ -0,0 +1,82 @@
+import collections
+import json
+import os
+
+# interrupt lifecycle events, in order:
+# created, enqueued, holder_start / holder_end (detail is the hook), routed (detail is stdin / stderr), resumed
+# or expired (detail is timed_out / cancelled) in place of resumed
+# failover (detail is the member left) sends a group interrupt back to be enqueued on another member
+# cache (detail is hit / coalesced) stands in for enqueued when the reply cache answers or a flight is joined
+
+
+class RingBufferSink:
+    # keeps the last capacity events in memory
+    def __init__(self, capacity : int = 100000):
+        self._events = collections.deque(maxlen=capacity)
+
+    def emit(self, event : str, timestamp : float, pid : int, tag : str, track_uuid : str, detail : str = None):
+        self._events.append((event, timestamp, pid, tag, track_uuid, detail))
+
+    def flush(self):
+        return
+
+    def events(self):
+        return [{'event': e[0], 'timestamp': e[1], 'pid': e[2], 'tag': e[3], 'track_uuid': e[4], 'detail': e[5]} for e in self._events]
+
+    def clear(self):
+        self._events.clear()
+
+
+class ChromeTraceSink:
+    # writes a Chrome trace (chrome://tracing, Perfetto) when the scheduler stops
+    # every interrupt is an async span from created to resumed, holder calls are nested spans
+    # keeps the last max_events events, older ones are dropped and counted in the trace's otherData
+    # with interval, events are appended every interval seconds instead, in the JSON array format whose closing bracket is optional,
+    # so each write costs only the events since the last one; at most max_events wait between writes and drops show as a counter
+    def __init__(self, path : str, max_events : int = 1000000, interval : float = None):
+        if max_events < 1: raise Exception("Trace needs room for at least one event!")
+        if interval != None and interval <= 0: raise Exception("Trace interval must be positive!")
+        self.path = path
+        self.interval = interval
+        self._events = collections.deque(maxlen=max_events)
+        self._dropped = 0
+        self._written_at = None
+        self._written = 0 # events appended to the file so far, only with interval
+        self._dropped_written = 0
+
+    def emit(self, event : str, timestamp : float, pid : int, tag : str, track_uuid : str, detail : str = None):
+        trace = {'ts': timestamp * 1000000, 'pid': os.getpid(), 'tid': tag, 'id': track_uuid, 'args': {'pid': pid, 'tag': tag}}
+        if event == 'created' or event == 'resumed' or event == 'expired':
+            trace.update(name='interrupt', cat='interrupt', ph='b' if event == 'created' else 'e')
+        elif event == 'holder_start' or event == 'holder_end':
+            trace.update(name=detail, cat='interrupt', ph='b' if event == 'holder_start' else 'e')
+        else:
+            trace.update(name=event if detail == None else '%s %s' % (event, detail), cat='interrupt', ph='n')
+        if len(self._events) == self._events.maxlen: self._dropped += 1
+        self._events.append(trace)
+        if self.interval == None: return
+        if self._written_at == None: self._written_at = timestamp
+        elif timestamp - self._written_at >= self.interval:
+            self._written_at = timestamp
+            self.flush()
+
+    def flush(self): # rewrites the file with the events kept so far, or appends the new ones with interval
+        if self.interval != None:
+            self._append()
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'traceEvents': list(self._events), 'displayTimeUnit': 'ms', 'otherData': {'dropped_events': self._dropped}}, f)
+        os.replace(temp_path, self.path)
+
+    def _append(self):
+        traces = list(self._events)
+        self._events.clear()
+        if self._dropped > self._dropped_written:
+            ts = traces[0]['ts'] if len(traces) > 0 else 0
+            traces.insert(0, {'name': 'dropped_events', 'cat': 'interrupt', 'ph': 'C', 'ts': ts, 'pid': os.getpid(), 'args': {'dropped': self._dropped}})
+            self._dropped_written = self._dropped
+        if len(traces) == 0: return
+        with open(self.path, 'a' if self._written > 0 else 'w') as f:
+            f.write((',\n' if self._written > 0 else '[\n') + ',\n'.join(json.dumps(trace) for trace in traces))
+        self._written += len(traces)
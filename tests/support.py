@@ -0,0 +1,37 @@
+import ioscheduler
+
+
+class OnceProcess(ioscheduler.ProcessHolder):
+    # awaits locals['action'](process) once, keeps what it returned or the exception type it raised in locals['result']
+    ### rewrite functions ###
+    @staticmethod
+    async def body(proc):
+        try:
+            proc.locals['result'] = await proc.locals['action'](proc)
+        except Exception as e:
+            proc.locals['result'] = type(e)
+        proc.locals['done'] = True
+
+    @staticmethod
+    def stop_condition(proc):
+        return proc.locals.get('done', False)
+    ### rewrite functions ###
+
+
+def create_processes(scheduler, actions : list, tag : str): # one OnceProcess per action, returns their locals
+    processes = [{'action': action} for action in actions]
+    for locals in processes: scheduler.create_process(OnceProcess, locals, tag)
+    return processes
+
+
+def results(processes : list):
+    return [locals['result'] for locals in processes]
+
+
+def run(holder, actions : list, transfer_locals : object = None, scheduler = None):
+    # one transfer tagged 'transfer' and one process per action, returns what the processes got and the scheduler
+    if scheduler == None: scheduler = ioscheduler.Scheduler('wakeup')
+    scheduler.create_transfer(holder, transfer_locals, 'transfer')
+    processes = create_processes(scheduler, actions, 'transfer')
+    scheduler.start()
+    return results(processes), scheduler
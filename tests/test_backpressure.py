@@ -0,0 +1,76 @@
+import asyncio
+import unittest
+
+import ioscheduler
+import support
+
+
+class Gate(ioscheduler.FreeTransferHolder):
+    # answers one chunk at a time after 0.02 seconds, logs (chunk, depth, held back, congested) as each is taken
+    capacity = 2
+    low_watermark = 0
+    concurrency = 1
+
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        tr.locals['log'].append((data, tr.depth(), tr.waiting(), tr.is_congested()))
+        await asyncio.sleep(0.02)
+        return data, request_uuid
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+class FailingGate(Gate):
+    overflow = 'fail'
+
+
+def send(i):
+    async def action(proc):
+        try:
+            return await proc.output_interrupt(i)
+        except Exception as e:
+            return str(e)
+    return action
+
+
+class BackpressureTest(unittest.TestCase):
+
+    def run_gate(self, holder):
+        transfer_locals = {'log': []}
+        results, scheduler = support.run(holder, [send(i) for i in range(6)], transfer_locals)
+        return results, transfer_locals['log'], scheduler
+
+    def test_held_interrupts_wait_for_the_low_watermark(self):
+        results, log, scheduler = self.run_gate(Gate)
+        self.assertEqual(results, list(range(6)))
+        # two admitted at a time, the rest held until the queue drains to the low watermark
+        self.assertEqual(log, [(0, 1, 4, True), (1, 0, 4, True), (2, 1, 2, True), (3, 0, 2, True), (4, 1, 0, True), (5, 0, 0, True)])
+        self.assertEqual(scheduler.metrics()['interrupts']['rejected'], 0)
+
+    def test_fail_overflow_rejects_in_the_process(self):
+        results, log, scheduler = self.run_gate(FailingGate)
+        self.assertEqual(results, [0, 1] + ["Transfer queue is full!"] * 4)
+        self.assertEqual([entry[0] for entry in log], [0, 1])
+        self.assertEqual(scheduler.metrics()['interrupts']['rejected'], 4)
+
+    def test_depth(self):
+        async def queued(proc):
+            await asyncio.sleep(0.01) # the others are admitted by now
+            return proc._scheduler.depth('transfer')
+        results, scheduler = support.run(Gate, [send(0), send(1), queued], {'log': []})
+        self.assertEqual(results, [0, 1, 1]) # one taken by the holder, one still queued
+        self.assertEqual(scheduler.depth('transfer'), 0)
+        self.assertEqual(scheduler.depth('missing'), 0)
+
+    def test_bad_limits_are_refused(self):
+        for capacity, low_watermark in ((0, None), (2, 2), (2, -1)):
+            holder = type('Bad', (Gate,), {'capacity': capacity, 'low_watermark': low_watermark})
+            self.assertRaises(Exception, ioscheduler.Scheduler('wakeup').create_transfer, holder, {'log': []}, 'transfer')
+
+
+if __name__ == '__main__':
+    unittest.main()
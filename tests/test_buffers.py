@@ -0,0 +1,74 @@
+import array
+import asyncio
+import pickle
+import socket
+import unittest
+
+from ioscheduler import BufferPool
+from ioscheduler.sharding import _out_of_band
+from ioscheduler.sharding import _Link
+
+
+class BufferPoolTest(unittest.TestCase):
+
+    def test_release_checks_ownership(self):
+        pool = BufferPool(16)
+        buffer = pool.acquire()
+        pool.release(buffer)
+        self.assertRaises(Exception, pool.release, buffer)
+        self.assertRaises(Exception, pool.release, bytearray(16))
+        pool.release(pool.acquire(32)) # one-off, not kept
+        self.assertEqual(pool.free_count(), 1)
+
+    def test_forgotten_buffer_keeps_its_id(self):
+        pool = BufferPool(16)
+        address = id(pool.acquire()) # never released
+        for _ in range(100):
+            foreign = bytearray(16)
+            self.assertNotEqual(id(foreign), address)
+            self.assertRaises(Exception, pool.release, foreign)
+
+    def test_resized_buffer_is_reported(self):
+        pool = BufferPool(16)
+        buffer = pool.acquire()
+        buffer.extend(b'x')
+        self.assertRaises(Exception, pool.release, buffer)
+        self.assertEqual(pool.outstanding_count(), 0)
+        self.assertEqual(pool.free_count(), 0)
+
+
+class LinkTest(unittest.TestCase):
+
+    def roundtrip(self, message):
+        # (message as the peer got it, pickle size, out-of-band buffer count)
+        async def exchange():
+            left, right = socket.socketpair()
+            sender, receiver = _Link(left), _Link(right)
+            await sender.open()
+            await receiver.open()
+            sender.send(message)
+            received = await receiver.recv()
+            await sender.close()
+            await receiver.close()
+            return received
+        buffers = []
+        size = len(pickle.dumps(tuple(_out_of_band(field) for field in message), 5, buffer_callback=buffers.append)) # as send() pickles it
+        return asyncio.run(exchange()), size, len(buffers)
+
+    def test_buffers_go_out_of_band_and_keep_their_type(self):
+        payload = bytearray(b'x' * 1000)
+        numbers = array.array('i', [1, 2, 3])
+        received, size, count = self.roundtrip((0, 'uuid', payload, memoryview(payload)[:10], b'bytes', numbers, None))
+        self.assertEqual(count, 2)
+        self.assertLess(size, 200) # neither buffer was copied into the pickle
+        self.assertIs(type(received[2]), bytearray)
+        self.assertEqual(received[2], payload)
+        self.assertIs(type(received[3]), memoryview)
+        self.assertEqual(bytes(received[3]), b'x' * 10)
+        self.assertEqual(received[4], b'bytes')
+        self.assertEqual(received[5], numbers)
+        self.assertEqual(received[:2] + received[6:], (0, 'uuid', None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+
+import ioscheduler
+import support
+
+
+class SlowFree(ioscheduler.FreeTransferHolder):
+    # answers every chunk with its upper-cased bytes after 0.1 seconds, one at a time
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        tr.locals['seen'].append(data)
+        await asyncio.sleep(0.1)
+        return data.upper(), request_uuid
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+class SlowBlocking(ioscheduler.BlockingTransferHolder):
+    # same, replies are routed by pid
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data):
+        tr.locals['seen'].append(data)
+        await asyncio.sleep(0.1)
+        return data.upper()
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+def run(holder, actions):
+    transfer_locals = {'seen': []}
+    results, scheduler = support.run(holder, actions, transfer_locals)
+    return results, transfer_locals['seen'], scheduler.metrics()['interrupts']
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def test_queued_interrupt_is_withdrawn(self):
+        actions = [lambda proc: proc.output_interrupt(b'first'), lambda proc: proc.output_interrupt(b'late', timeout=0.05)]
+        results, seen, interrupts = run(SlowFree, actions)
+        self.assertEqual(results, [b'FIRST', asyncio.TimeoutError])
+        self.assertEqual(seen, [b'first']) # the holder never got the expired one
+        self.assertEqual(interrupts['timed_out'], 1)
+
+    def check_late_reply_is_retired(self, holder):
+        async def twice(proc):
+            try:
+                await proc.output_interrupt(b'slow', timeout=0.05)
+            except asyncio.TimeoutError:
+                pass
+            return await proc.output_interrupt(b'next')
+        results, seen, _ = run(holder, [twice])
+        self.assertEqual(results, [b'NEXT']) # not the reply to the expired request
+        self.assertEqual(seen, [b'slow', b'next'])
+
+    def test_late_reply_by_uuid(self):
+        self.check_late_reply_is_retired(SlowFree)
+
+    def test_late_reply_by_pid(self):
+        self.check_late_reply_is_retired(SlowBlocking)
+
+    def test_cancelled_stream_withdraws_chunks(self):
+        async def cancelled(proc):
+            async def send_all():
+                async with proc.stream() as stream:
+                    for i in range(6): await stream.send(b'%d' % i)
+            await asyncio.wait_for(send_all(), 0.15)
+        results, seen, interrupts = run(SlowFree, [cancelled])
+        self.assertEqual(results, [asyncio.TimeoutError])
+        self.assertLess(len(seen), 6)
+        self.assertEqual(interrupts['cancelled'], 6 - interrupts['answered'])
+
+    def test_stream_chunk_timeout(self):
+        async def timed(proc):
+            async with proc.stream(timeout=0.15) as stream:
+                for i in range(6): await stream.send(b'%d' % i)
+        results, seen, interrupts = run(SlowFree, [timed])
+        self.assertEqual(results, [asyncio.TimeoutError])
+        self.assertLess(len(seen), 6)
+        self.assertGreater(interrupts['timed_out'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
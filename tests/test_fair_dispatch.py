@@ -0,0 +1,46 @@
+import unittest
+
+import ioscheduler
+
+
+class CountingProcess(ioscheduler.ProcessHolder):
+    ### rewrite functions ###
+    @staticmethod
+    async def body(proc):
+        proc.locals['counts'][proc.priority] += 1
+
+    @staticmethod
+    def stop_condition(proc):
+        return sum(proc.locals['counts'].values()) >= 400
+    ### rewrite functions ###
+
+
+class FairDispatchTest(unittest.TestCase):
+
+    def dispatch(self, mode):
+        scheduler = ioscheduler.Scheduler(mode, idle_timeout=0.1, classes={'hi': 3, 'lo': 1}, dispatch_limit=1)
+        counts = {'hi': 0, 'lo': 0}
+        scheduler.create_process(CountingProcess, {'counts': counts}, 'lo', 'lo')
+        scheduler.create_process(CountingProcess, {'counts': counts}, 'hi', 'hi')
+        scheduler.start()
+        return counts, scheduler.class_metrics()
+
+    def check_ratio(self, mode):
+        counts, stats = self.dispatch(mode)
+        self.assertEqual(counts['hi'] + counts['lo'], 400)
+        self.assertAlmostEqual(counts['hi'] / counts['lo'], 3, delta=0.2)
+        self.assertGreaterEqual(stats['hi']['iterations'], counts['hi'])
+        self.assertGreater(stats['lo']['deferred'], 0)
+
+    def test_polling(self):
+        self.check_ratio('polling')
+
+    def test_wakeup(self):
+        self.check_ratio('wakeup')
+
+    def test_worker(self):
+        self.check_ratio('worker')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import asyncio
+import unittest
+
+import ioscheduler
+import support
+
+
+class Member(ioscheduler.FreeTransferHolder):
+    # answers with its tag and the payload, a member whose locals say so fails its first call after a pause
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        tr.locals['seen'].append(data)
+        await asyncio.sleep(0.02)
+        if tr.locals['fail'] == True and len(tr.locals['seen']) == 1: return 'fail', request_uuid
+        return (tr.tag, data), request_uuid
+
+    @staticmethod
+    def is_fatal(tr, return_code):
+        return return_code == 'fail'
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+class StoppingMember(Member):
+    # leaves once it has answered one call
+    ### rewrite functions ###
+    @staticmethod
+    def stop_condition(tr):
+        return len(tr.locals['seen']) > 0
+    ### rewrite functions ###
+
+
+class GroupTest(unittest.TestCase):
+
+    def run_group(self, first_holder, fail):
+        scheduler = ioscheduler.Scheduler('wakeup')
+        members = {'first': {'seen': [], 'fail': fail}, 'second': {'seen': [], 'fail': False}}
+        scheduler.create_transfer(first_holder, members['first'], 'first')
+        scheduler.create_transfer(Member, members['second'], 'second')
+        scheduler.create_group('group', ['first', 'second'], cooldown=60.0)
+        processes = support.create_processes(scheduler, [lambda proc, i=i: proc.output_interrupt(i) for i in range(10)], 'group')
+        scheduler.start()
+        return support.results(processes), members, scheduler.metrics()['groups']['group']
+
+    def test_fatal_member_hands_queued_interrupts_on(self):
+        results, members, group = self.run_group(Member, True)
+        self.assertEqual(members['first']['seen'], [members['first']['seen'][0]]) # skipped for the cooldown after failing
+        self.assertEqual(results.count('fail'), 1)
+        for i, result in enumerate(results):
+            if result != 'fail': self.assertEqual(result, ('second', i)) # replies route back by member tag
+        self.assertGreater(group['failovers'], 0)
+        self.assertEqual(sum(group['dispatched'].values()), 10 + group['failovers'])
+
+    def test_stopped_member_hands_queued_interrupts_on(self):
+        results, members, group = self.run_group(StoppingMember, False)
+        self.assertEqual(len(members['first']['seen']), 1)
+        self.assertEqual(sorted(results), sorted([('first', members['first']['seen'][0])] + [('second', i) for i in members['second']['seen']]))
+        self.assertEqual(len(members['second']['seen']), 9)
+        self.assertGreater(group['failovers'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
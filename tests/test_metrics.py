@@ -0,0 +1,87 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import ioscheduler
+import support
+
+
+class Echo(ioscheduler.FreeTransferHolder):
+    # answers with the payload
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        return data, request_uuid
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+def other_echo():
+    class Echo(ioscheduler.FreeTransferHolder): # same class name as the module level one
+        ### rewrite functions ###
+        @staticmethod
+        async def stdout(tr, data, request_uuid):
+            return data, request_uuid
+
+        @staticmethod
+        def stop_condition(tr):
+            return tr._scheduler.processes_alive() == 0
+        ### rewrite functions ###
+    return Echo
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_same_named_holders_keep_their_own_timings(self):
+        scheduler = ioscheduler.Scheduler('wakeup')
+        scheduler.create_transfer(Echo, None, 'first')
+        scheduler.create_transfer(other_echo(), None, 'second')
+        support.create_processes(scheduler, [lambda proc: proc.output_interrupt(b'x')], 'first')
+        support.create_processes(scheduler, [lambda proc: proc.output_interrupt(b'y')] * 2, 'second')
+        scheduler.start()
+        timings = scheduler.metrics()['iteration_seconds']
+        self.assertIn('test_metrics.Echo', timings)
+        self.assertIn('test_metrics.other_echo.<locals>.Echo', timings)
+        self.assertIn('support.OnceProcess', timings)
+
+    def test_prometheus_text(self):
+        scheduler = ioscheduler.Scheduler('wakeup')
+        scheduler.create_transfer(Echo, None, 'say "hi"\n')
+        support.create_processes(scheduler, [lambda proc: proc.output_interrupt(b'x')] * 3, 'say "hi"\n')
+        scheduler.start()
+        snapshot = scheduler.metrics()
+        lines = ioscheduler.to_prometheus(snapshot).splitlines()
+        self.assertIn('# TYPE ioscheduler_interrupts_total counter', lines)
+        self.assertIn('ioscheduler_interrupts_total{outcome="answered"} 3', lines)
+        self.assertIn('ioscheduler_processes_alive 0', lines)
+        self.assertIn('ioscheduler_transfer_queue_depth{tag="say \\"hi\\"\\n",queue="stdout"} 0', lines) # label values are escaped
+        buckets = [line for line in lines if line.startswith('ioscheduler_interrupt_wait_seconds_bucket')]
+        counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+        self.assertEqual(counts, sorted(counts)) # cumulative
+        self.assertTrue(buckets[-1].startswith('ioscheduler_interrupt_wait_seconds_bucket{le="+Inf"}'))
+        self.assertEqual(counts[-1], 3)
+        self.assertIn('ioscheduler_interrupt_wait_seconds_count 3', lines)
+        self.assertIn('ioscheduler_iteration_seconds_count{holder="test_metrics.Echo",call="stdout"} %d'
+                      % snapshot['iteration_seconds']['test_metrics.Echo']['stdout']['count'], lines)
+
+    def test_metrics_file_is_dumped_while_running_and_at_the_end(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.prom')
+            async def look(proc):
+                await asyncio.sleep(0.2)
+                with open(path) as f: return f.read()
+            scheduler = ioscheduler.Scheduler('wakeup', metrics_file=path, metrics_interval=0.05)
+            scheduler.create_transfer(Echo, None, 'transfer')
+            processes = support.create_processes(scheduler, [look], 'transfer')
+            scheduler.start()
+            self.assertIn('ioscheduler_processes_alive 1\n', support.results(processes)[0])
+            with open(path) as f: self.assertEqual(f.read(), ioscheduler.to_prometheus(scheduler.metrics()))
+            self.assertEqual(os.listdir(directory), ['metrics.prom']) # no temporary file left behind
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+
+import ioscheduler
+import support
+
+
+class Checked(ioscheduler.FreeTransferHolder):
+    # answers each chunk with None after 0.01 seconds, one at a time, b'bad' with a fatal code
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        tr.locals['seen'].append(data)
+        await asyncio.sleep(0.01)
+        if data == b'bad': return 'broken', request_uuid
+        return None, request_uuid
+
+    @staticmethod
+    def is_fatal(tr, return_code):
+        return return_code == 'broken'
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+def streamed(chunks, window = None, catch_in_block = False):
+    # (where the fatal code surfaced, stream codes, stream error)
+    async def action(proc):
+        raised_at = None
+        try:
+            async with proc.stream(window) as stream:
+                for chunk in chunks:
+                    try:
+                        await stream.send(chunk)
+                    except Exception as e:
+                        raised_at = ('send', chunk, str(e))
+                        if catch_in_block == False: raise
+        except Exception as e:
+            if raised_at == None: raised_at = ('end', None, str(e))
+        return raised_at, stream.codes, stream.error
+    return action
+
+
+def run(action):
+    transfer_locals = {'seen': []}
+    results, _ = support.run(Checked, [action], transfer_locals)
+    return results[0], transfer_locals['seen']
+
+
+class OutputStreamTest(unittest.TestCase):
+
+    def test_fatal_code_raises_from_the_next_send(self):
+        (raised_at, codes, error), seen = run(streamed([b'bad', b'a', b'b', b'c'], window=1))
+        self.assertEqual(raised_at, ('send', b'a', "Transfer reported a fatal code 'broken'!")) # a waited for bad's reply
+        self.assertEqual(error, 'broken')
+        self.assertEqual(codes, ['broken'])
+        self.assertNotIn(b'b', seen) # nothing is sent after it surfaced
+
+    def test_fatal_code_raises_at_the_end_of_the_block(self):
+        (raised_at, codes, error), seen = run(streamed([b'a', b'bad', b'b']))
+        self.assertEqual(raised_at, ('end', None, "Transfer reported a fatal code 'broken'!"))
+        self.assertEqual(codes, [None, 'broken', None])
+        self.assertEqual(error, 'broken')
+
+    def test_fatal_code_is_raised_once(self):
+        (raised_at, codes, error), seen = run(streamed([b'bad', b'a', b'b', b'c'], window=1, catch_in_block=True))
+        self.assertEqual(raised_at, ('send', b'a', "Transfer reported a fatal code 'broken'!")) # not again from b, c or the end
+        self.assertEqual(codes, ['broken', None, None, None])
+        self.assertEqual(seen, [b'bad', b'a', b'b', b'c'])
+
+
+if __name__ == '__main__':
+    unittest.main()
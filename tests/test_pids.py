@@ -0,0 +1,56 @@
+import asyncio
+import unittest
+
+import ioscheduler
+import support
+
+
+class Upper(ioscheduler.BlockingTransferHolder):
+    # answers with the upper-cased bytes, replies are routed by pid
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data):
+        return data.upper()
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+async def once(proc):
+    return proc.pid, await proc.output_interrupt(b'first')
+
+
+def spawn_later(locals):
+    # starts a new process with locals once pid 1 is reaped and waits for it, returns its own pid
+    async def action(proc):
+        scheduler = proc._scheduler
+        while scheduler.get_process(1) != None: await asyncio.sleep(0.01)
+        async def again(proc):
+            return proc.pid, scheduler.get_process(proc.pid) is proc, await proc.output_interrupt(b'second')
+        locals['action'] = again
+        await scheduler.create_process(support.OnceProcess, locals, 'transfer')
+        return proc.pid
+    return action
+
+
+class PidTest(unittest.TestCase):
+
+    def test_reaped_pid_is_reused(self):
+        spawned = {}
+        results, scheduler = support.run(Upper, [once, spawn_later(spawned)])
+        self.assertEqual(results, [(1, b'FIRST'), 2])
+        self.assertEqual(spawned['result'], (1, True, b'SECOND')) # the new process got the first one's pid and its own reply
+        self.assertEqual(scheduler.get_process(1), None)
+
+    def test_live_pids_are_unique(self):
+        async def pid(proc):
+            await asyncio.sleep(0.01)
+            return proc.pid
+        results, _ = support.run(Upper, [pid] * 50)
+        self.assertEqual(sorted(results), list(range(1, 51)))
+
+
+if __name__ == '__main__':
+    unittest.main()
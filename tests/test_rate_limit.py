@@ -0,0 +1,52 @@
+import time
+import unittest
+
+import ioscheduler
+import support
+
+
+class Limited(ioscheduler.FreeTransferHolder):
+    # answers at once, logs when each chunk reached it
+    rate = 20
+    burst = 2
+    concurrency = 8
+
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        tr.locals['times'].append(time.monotonic())
+        return data, request_uuid
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+class RateLimitTest(unittest.TestCase):
+
+    def run_limited(self, mode):
+        transfer_locals = {'times': []}
+        started = time.monotonic()
+        results, _ = support.run(Limited, [lambda proc, i=i: proc.output_interrupt(i) for i in range(6)], transfer_locals, ioscheduler.Scheduler(mode))
+        self.assertEqual(sorted(results), list(range(6)))
+        times = transfer_locals['times']
+        self.assertLess(times[1] - started, 0.03) # the burst goes at once
+        for earlier, later in zip(times[1:], times[2:]):
+            self.assertGreater(later - earlier, 0.04) # then one every 1 / rate seconds
+        self.assertLess(times[-1] - started, 0.5) # each refill wakes the scheduler, nothing waits on idle polling
+
+    def test_wakeup(self):
+        self.run_limited('wakeup')
+
+    def test_worker(self):
+        self.run_limited('worker')
+
+    def test_bad_limits_are_refused(self):
+        for rate, burst in ((0, 1), (-1, 1), (10, 0)):
+            holder = type('Bad', (Limited,), {'rate': rate, 'burst': burst})
+            self.assertRaises(Exception, ioscheduler.Scheduler('wakeup').create_transfer, holder, {'times': []}, 'transfer')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+import ioscheduler
+import support
+
+
+class Lookup(ioscheduler.BlockingTransferHolder):
+    # answers a request with its upper-cased bytes after 0.05 seconds, b'bad' gets a fatal code
+    cache_key = staticmethod(lambda data: data)
+
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data):
+        tr.locals['request'] = data
+        return None
+
+    @staticmethod
+    async def stdin(tr):
+        request = tr.locals['request']
+        tr.locals['calls'].append(request)
+        await asyncio.sleep(0.05)
+        if request == b'bad': return None, 'fatal'
+        return request.upper(), None
+
+    @staticmethod
+    def is_fatal(tr, return_code):
+        return return_code == 'fatal'
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+def ask(request, delay = 0, timeout = None):
+    async def action(proc):
+        await asyncio.sleep(delay)
+        return await proc.input_interrupt(proc_output=request, timeout=timeout)
+    return action
+
+
+def run(actions):
+    transfer_locals = {'calls': []}
+    results, scheduler = support.run(Lookup, actions, transfer_locals)
+    return results, transfer_locals['calls'], scheduler.metrics()['caches']['transfer']
+
+
+class ReplyCacheTest(unittest.TestCase):
+
+    def test_identical_requests_share_one_call(self):
+        results, calls, cache = run([ask(b'same') for _ in range(10)] + [ask(b'other'), ask(b'same', delay=0.2)])
+        self.assertEqual(results, [(b'SAME', None)] * 10 + [(b'OTHER', None), (b'SAME', None)])
+        self.assertEqual(sorted(calls), [b'other', b'same'])
+        self.assertEqual((cache['misses'], cache['coalesced'], cache['hits']), (2, 9, 1))
+
+    def test_fatal_reply_is_not_cached(self):
+        results, calls, cache = run([ask(b'bad'), ask(b'bad', delay=0.2)])
+        self.assertEqual(results, [(None, 'fatal')] * 2)
+        self.assertEqual(calls, [b'bad', b'bad'])
+        self.assertEqual(cache['entries'], 0)
+
+    def test_expired_leader_hands_the_flight_on(self):
+        results, calls, cache = run([ask(b'same', timeout=0.02)] + [ask(b'same') for _ in range(3)])
+        self.assertEqual(results, [asyncio.TimeoutError] + [(b'SAME', None)] * 3)
+        self.assertEqual(calls, [b'same', b'same']) # a follower led the second call
+        self.assertEqual(cache['coalesced'], 3 + 2)
+
+    def test_unhashable_key_skips_the_cache(self):
+        results, calls, cache = run([ask(bytearray(b'raw')), ask(bytearray(b'raw'))])
+        self.assertEqual(results, [(b'RAW', None)] * 2)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual((cache['key_errors'], cache['misses']), (2, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
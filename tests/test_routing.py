@@ -0,0 +1,33 @@
+import asyncio
+import unittest
+
+import ioscheduler
+import support
+
+
+class Echo(ioscheduler.FreeTransferHolder):
+    # answers every request with its payload, several at once
+    concurrency = 4
+
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        await asyncio.sleep(0.01)
+        return data, request_uuid
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+class RoutingTest(unittest.TestCase):
+
+    def test_repeated_track_uuid(self):
+        actions = [lambda proc: proc.output_interrupt(proc.pid, track_uuid='fixed', timeout=5.0) for _ in range(3)]
+        results, _ = support.run(Echo, actions)
+        self.assertEqual(results, [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
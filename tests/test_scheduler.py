@@ -0,0 +1,58 @@
+import asyncio
+import unittest
+
+import ioscheduler
+
+
+class CountdownProcess(ioscheduler.ProcessHolder):
+    ### rewrite functions ###
+    @staticmethod
+    async def body(proc):
+        proc.locals['left'] -= 1
+        await asyncio.sleep(0)
+
+    @staticmethod
+    def stop_condition(proc):
+        return proc.locals['left'] <= 0
+    ### rewrite functions ###
+
+
+class WatchingTransfer(ioscheduler.FreeTransferHolder):
+    ### rewrite functions ###
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+class SchedulerTest(unittest.TestCase):
+
+    def test_module_start_runs_on_default_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            ran = []
+            async def monitor():
+                ran.append('monitor ran')
+            loop.create_task(monitor())
+            ioscheduler.create_process(CountdownProcess, {'left': 3}, 'countdown')
+            ioscheduler.start()
+            self.assertEqual(ran, ['monitor ran'])
+            self.assertFalse(loop.is_closed())
+            self.assertEqual(ioscheduler.processes_alive(), 0)
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
+
+    def test_alive_counts(self):
+        scheduler = ioscheduler.Scheduler('wakeup')
+        scheduler.create_transfer(WatchingTransfer, None, 'watch')
+        future = scheduler.create_process(CountdownProcess, {'left': 3}, 'countdown')
+        self.assertEqual((scheduler.processes_alive(), scheduler.transfers_alive()), (1, 1))
+        scheduler.start()
+        self.assertTrue(future.done())
+        self.assertEqual((scheduler.processes_alive(), scheduler.transfers_alive()), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import asyncio
+import unittest
+
+import ioscheduler
+from ioscheduler.sharding import ShardedScheduler
+
+
+class Echo(ioscheduler.FreeTransferHolder):
+    # answers every request with its payload, stops once every shard's processes have
+    concurrency = 4
+
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        await asyncio.sleep(0.01)
+        return data, request_uuid
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr.locals['cluster'].processes_alive() == 0
+    ### rewrite functions ###
+
+
+class Kind(Echo):
+    # answers with the type of the payload the holder got
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        return type(data).__name__, request_uuid
+    ### rewrite functions ###
+
+
+class Ask(ioscheduler.ProcessHolder):
+    # sends locals['payload'] once and returns the reply, the shard hands it back as the process result
+    ### rewrite functions ###
+    @staticmethod
+    async def body(proc):
+        proc.locals['done'] = True
+        try:
+            return await proc.output_interrupt(proc.locals['payload'], track_uuid=proc.locals.get('track_uuid'), timeout=5.0)
+        except asyncio.TimeoutError:
+            return 'timed out'
+
+    @staticmethod
+    def stop_condition(proc):
+        return proc.locals.get('done', False)
+    ### rewrite functions ###
+
+
+class ShardedTest(unittest.TestCase):
+
+    def run_cluster(self, asks : list, holder = Echo): # (payload, track_uuid, shard) per process, the transfer lives on shard 1
+        cluster = ShardedScheduler(2)
+        cluster.create_transfer(holder, {'cluster': cluster}, 'echo', shard=1)
+        futures = [cluster.create_process(Ask, {'payload': payload, 'track_uuid': track_uuid}, 'echo', shard=shard) for payload, track_uuid, shard in asks]
+        cluster.start()
+        self.assertEqual(cluster.processes_alive(), 0)
+        return [future.result() for future in futures]
+
+    def test_local_and_forwarded_interrupts(self):
+        results = self.run_cluster([('local', None, 1), ('remote', None, 0), (b'bytes', None, 0)])
+        self.assertEqual(results, ['local', 'remote', b'bytes'])
+
+    def test_repeated_track_uuid_across_shards(self):
+        results = self.run_cluster([(1, 'fixed', 0), (2, 'fixed', 0), (3, 'fixed', 1)])
+        self.assertEqual(results, [1, 2, 3])
+
+    def test_payload_types_match_a_local_holder(self):
+        payloads = [bytearray(b'raw'), memoryview(b'view'), b'bytes']
+        local = self.run_cluster([(payload, None, 1) for payload in payloads], Kind)
+        remote = self.run_cluster([(payload, None, 0) for payload in payloads], Kind)
+        self.assertEqual(local, ['bytearray', 'memoryview', 'bytes'])
+        self.assertEqual(remote, local)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import ioscheduler
+from ioscheduler import streams
+import support
+
+
+def stops_with_processes(holder):
+    # stops once the processes have, keeping the last stream stats in locals['stats']
+    class Holder(holder):
+        reconnect_delay = 0.01
+
+        ### rewrite functions ###
+        @staticmethod
+        async def on_stop(tr):
+            tr.locals['stats'] = holder.stream_stats(tr)
+            await holder.on_stop(tr)
+
+        @staticmethod
+        def stop_condition(tr):
+            return tr._scheduler.processes_alive() == 0
+        ### rewrite functions ###
+    return Holder
+
+
+class StreamTest:
+    # run against a local serve_frames server, subclasses set the holder, the asyncio server function and where it listens
+    holder = None
+    start_server = None
+    address = None # start_server keyword arguments, a path is made relative to a temporary directory and port 0 picks a free one
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_scheduler(self, actions, after_start = None):
+        # runs one process per action against a server answering with the upper-cased payload, returns their results and the stream stats
+        async def upper(payload):
+            if payload == b'slow': await asyncio.sleep(0.1)
+            if payload == b'hang': await asyncio.sleep(3600)
+            return bytes(payload).upper()
+        writers = []
+        async def connected(reader, writer):
+            writers.append(writer)
+            await streams.serve_frames(reader, writer, upper)
+        async def main():
+            address = dict(self.address)
+            if 'path' in address: address['path'] = os.path.join(self.directory.name, address['path'])
+            server = await self.start_server(connected, **address)
+            if 'port' in address: address['port'] = server.sockets[0].getsockname()[1]
+            scheduler = ioscheduler.Scheduler('wakeup')
+            scheduler.create_transfer(stops_with_processes(self.holder), address, 'peer')
+            processes = support.create_processes(scheduler, actions, 'peer')
+            if after_start != None: asyncio.ensure_future(after_start(writers))
+            await asyncio.wait_for(scheduler.run(), 10)
+            server.close()
+            for writer in writers: writer.close()
+            await server.wait_closed()
+            return support.results(processes), address['stats']
+        return asyncio.run(main())
+
+    def test_out_of_order_replies_reach_their_requests(self):
+        payloads = [b'slow', b'a', b'b', b'slow', b'c'] # slow ones are answered after the requests sent behind them
+        results, _ = self.run_scheduler([lambda proc, payload=payload: proc.output_interrupt(payload) for payload in payloads])
+        self.assertEqual(results, [payload.upper() for payload in payloads])
+
+    def test_frames_are_coalesced(self):
+        results, stats = self.run_scheduler([lambda proc, i=i: proc.output_interrupt(b'x%d' % i) for i in range(50)])
+        self.assertEqual(results, [b'X%d' % i for i in range(50)])
+        self.assertEqual(stats['frames'], 50)
+        self.assertLess(stats['writes'], stats['frames'])
+
+    def test_reconnect_fails_in_flight_requests(self):
+        async def after_hang(proc):
+            await asyncio.sleep(0.3) # sent once the transfer has reconnected
+            return await proc.output_interrupt(b'after')
+        async def drop(writers):
+            await asyncio.sleep(0.1)
+            writers[0].transport.abort()
+        actions = [lambda proc: proc.output_interrupt(b'hang'), lambda proc: proc.input_interrupt(proc_output=b'hang'), after_hang]
+        results, stats = self.run_scheduler(actions, after_start=drop)
+        self.assertEqual(results, ['disconnected', (None, 'disconnected'), b'AFTER'])
+        self.assertEqual(stats['connects'], 2)
+
+    def test_oversized_payload_is_not_sent(self):
+        actions = [lambda proc: proc.output_interrupt(bytearray(streams._MAX_FRAME + 1))]
+        actions.extend(lambda proc: proc.output_interrupt(b'small') for _ in range(5))
+        results, stats = self.run_scheduler(actions)
+        self.assertEqual(results, ['invalid_payload'] + [b'SMALL'] * 5)
+        self.assertEqual(stats['connects'], 1)
+
+    def test_input_interrupt_without_payload(self):
+        actions = [lambda proc: proc.input_interrupt(timeout=5.0), lambda proc: proc.input_interrupt(proc_output=b'q')]
+        results, _ = self.run_scheduler(actions)
+        self.assertEqual(results, [(None, 'invalid_payload'), (b'Q', None)])
+
+
+class UnixStreamTest(StreamTest, unittest.TestCase):
+    holder = ioscheduler.UnixTransferHolder
+    start_server = staticmethod(asyncio.start_unix_server)
+    address = {'path': 'peer.sock'}
+
+
+class TcpStreamTest(StreamTest, unittest.TestCase):
+    holder = ioscheduler.TcpTransferHolder
+    start_server = staticmethod(asyncio.start_server)
+    address = {'host': '127.0.0.1', 'port': 0}
+
+
+class ServeFramesTest(unittest.TestCase):
+
+    def test_oversized_frame_closes_the_connection(self):
+        async def main():
+            closed = asyncio.get_running_loop().create_future()
+            async def connected(reader, writer):
+                await streams.serve_frames(reader, writer, lambda payload: payload)
+                closed.set_result(True)
+            server = await asyncio.start_server(connected, '127.0.0.1', 0)
+            reader, writer = await asyncio.open_connection('127.0.0.1', server.sockets[0].getsockname()[1])
+            writer.write(streams._FRAME.pack(streams._MAX_FRAME + 1, 1) + b'u')
+            self.assertEqual(await reader.read(), b'')
+            self.assertTrue(await asyncio.wait_for(closed, 5))
+            writer.close()
+            server.close()
+            await server.wait_closed()
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+import ioscheduler
+import support
+
+
+class Echo(ioscheduler.FreeTransferHolder):
+    # answers with the payload after 0.01 seconds
+    ### rewrite functions ###
+    @staticmethod
+    async def stdout(tr, data, request_uuid):
+        await asyncio.sleep(0.01)
+        return data, request_uuid
+
+    @staticmethod
+    def stop_condition(tr):
+        return tr._scheduler.processes_alive() == 0
+    ### rewrite functions ###
+
+
+async def three_in_turn(proc):
+    for i in range(3): await proc.output_interrupt(i)
+
+
+def traced(tracer, actions):
+    results, _ = support.run(Echo, actions, None, ioscheduler.Scheduler('wakeup', tracer=tracer))
+    return results
+
+
+# what one answered output_interrupt leaves in a trace, in order
+RING_EVENTS = [('created', None), ('enqueued', None), ('holder_start', 'stdout'), ('holder_end', 'stdout'), ('routed', 'stderr'), ('resumed', None)]
+CHROME_EVENTS = [('interrupt', 'b'), ('enqueued', 'n'), ('stdout', 'b'), ('stdout', 'e'), ('routed stderr', 'n'), ('interrupt', 'e')]
+
+
+class RingBufferSinkTest(unittest.TestCase):
+
+    def test_events_in_order(self):
+        sink = ioscheduler.RingBufferSink()
+        traced(sink, [three_in_turn])
+        events = sink.events()
+        self.assertEqual([(e['event'], e['detail']) for e in events], RING_EVENTS * 3)
+        for first in range(0, len(events), len(RING_EVENTS)):
+            span = events[first:first + len(RING_EVENTS)]
+            self.assertEqual(len(set(e['track_uuid'] for e in span)), 1) # one interrupt per span
+            self.assertEqual([e['timestamp'] for e in span], sorted(e['timestamp'] for e in span))
+
+    def test_keeps_the_latest(self):
+        sink = ioscheduler.RingBufferSink(4)
+        traced(sink, [three_in_turn])
+        self.assertEqual([(e['event'], e['detail']) for e in sink.events()], RING_EVENTS[-4:])
+        sink.clear()
+        self.assertEqual(sink.events(), [])
+
+
+class ChromeTraceSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'trace.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_written_when_stopped(self):
+        traced(ioscheduler.ChromeTraceSink(self.path), [three_in_turn])
+        with open(self.path) as f: trace = json.load(f)
+        self.assertEqual([(e['name'], e['ph']) for e in trace['traceEvents']], CHROME_EVENTS * 3)
+        self.assertEqual(trace['otherData'], {'dropped_events': 0})
+        self.assertEqual(os.listdir(self.directory.name), ['trace.json'])
+
+    def test_drops_the_oldest(self):
+        traced(ioscheduler.ChromeTraceSink(self.path, max_events=4), [three_in_turn])
+        with open(self.path) as f: trace = json.load(f)
+        self.assertEqual([(e['name'], e['ph']) for e in trace['traceEvents']], CHROME_EVENTS[-4:])
+        self.assertEqual(trace['otherData'], {'dropped_events': len(CHROME_EVENTS) * 3 - 4})
+
+    def read_appended(self):
+        with open(self.path) as f: text = f.read()
+        self.assertTrue(text.startswith('[\n'))
+        self.assertFalse(text.rstrip().endswith(']')) # the closing bracket is left off so later writes can append
+        return json.loads(text + ']')
+
+    def test_interval_appends(self):
+        traced(ioscheduler.ChromeTraceSink(self.path, interval=0.001), [three_in_turn])
+        events = self.read_appended()
+        self.assertEqual([(e['name'], e['ph']) for e in events], CHROME_EVENTS * 3)
+
+    def test_interval_counts_drops(self):
+        traced(ioscheduler.ChromeTraceSink(self.path, max_events=4, interval=0.001), [three_in_turn])
+        events = self.read_appended()
+        counters = [e['args']['dropped'] for e in events if e['ph'] == 'C']
+        self.assertGreater(len(counters), 0)
+        self.assertEqual(counters, sorted(counters)) # the counter carries the running total
+        kept = [(e['name'], e['ph']) for e in events if e['ph'] != 'C']
+        self.assertEqual(len(kept) + counters[-1], len(CHROME_EVENTS) * 3) # every event was either written or counted
+        self.assertEqual(kept[-2:], CHROME_EVENTS[-2:])
+
+
+if __name__ == '__main__':
+    unittest.main()